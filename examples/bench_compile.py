@@ -0,0 +1,63 @@
+import time
+import argparse
+import torch
+from rockmate import Rockmate
+from rockmate.compiler import Compiler, RK_Storage
+from rockmate.models import get_GPT
+import sys
+sys.setrecursionlimit(10000)
+
+'''Benchmark of the compilation of the full schedule.
+
+For each GPT2 model, Rockmate solves the chain at the given budget,
+without compiling it. We then report the number of operations of the
+schedule (fwd + bwd, as in save_to_file), and the time Compiler.compile
+takes on it, with one list of functions per operation and with one
+function per SeqBlock (fused=True). This is also the time spent in
+load_from_file.
+'''
+
+parser = argparse.ArgumentParser("Schedule compilation benchmark")
+parser.add_argument(
+    "--models", nargs="+", default=["GPT2-small", "GPT2-medium"]
+)
+parser.add_argument("--budget", type=float, default=1, help="in GB")
+parser.add_argument("--solver", default="MIP")
+parser.add_argument("--batch-size", type=int, default=2)
+parser.add_argument("--seq-len", type=int, default=128)
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+print(
+    f"{'model':>12} {'#blocks':>8} {'#ops':>7} "
+    f"{'compile (s)':>12} {'fused (s)':>10}"
+)
+for model_name in args.models:
+    model = get_GPT(model=model_name)
+    sample = [torch.randint(0, 600, [args.batch_size, args.seq_len])]
+    rkMod = Rockmate(
+        model,
+        sample,
+        args.budget * 1024 ** 3,
+        solver=args.solver,
+        get_compiled_fct=False,
+    )
+    segments = [
+        len(seq.op_sched.op_list)
+        for seq in rkMod.fwd_seq.seq + rkMod.bwd_seq.seq
+    ]
+    times = {}
+    for mode, seg in [("compile", None), ("fused", segments)]:
+        times[mode] = float("inf")
+        for _ in range(args.repeat):
+            storage = RK_Storage(
+                rkMod.device, rkMod.original_mod, rkMod.dict_constants
+            )
+            start = time.time()
+            Compiler(storage).compile(rkMod.op_sched, seg)
+            times[mode] = min(times[mode], time.time() - start)
+    print(
+        f"{model_name:>12} {len(rkMod.list_kg):>8} "
+        f"{len(rkMod.op_sched.op_list):>7} "
+        f"{times['compile']:>12.3f} {times['fused']:>10.3f}"
+    )
@@ -0,0 +1,91 @@
+import time
+import argparse
+import numpy as np
+import torch
+import rkgb
+from rockmate.models import get_GPT
+from rockmate.heuristic_solver import ModelHeuristic
+import sys
+sys.setrecursionlimit(10000)
+
+'''Benchmark of the heuristic block scheduler against the block ILP.
+
+The K_graphs of a GPT model are built with rkgb, then each block is
+solved on a budget grid similar to the one of get_rk_block, with
+ModelHeuristic and with an ILP model (ModelGurobi, ModelMIP or
+ModelHiGHS). For each budget, we report whether each one found a
+schedule, the time of the heuristic schedule relative to the ILP one
+(fwd + bwd) and the solve times.
+'''
+
+parser = argparse.ArgumentParser("Heuristic block solver benchmark")
+parser.add_argument("--model", default="GPT2-small")
+parser.add_argument(
+    "--solver", default="HiGHS", choices=["MIP", "mip", "HiGHS"]
+)
+parser.add_argument("--nb-budget-all", type=int, default=5)
+parser.add_argument("--nb-budget-abar", type=int, default=3)
+parser.add_argument("--batch-size", type=int, default=2)
+parser.add_argument("--seq-len", type=int, default=128)
+args = parser.parse_args()
+
+if args.solver == "MIP":
+    from rockmate.ILP_gurobi_solver import ModelGurobi
+
+    get_ilp = lambda kg, bd, sbd: ModelGurobi(
+        kg, bd, sbd, gcd=10000, gurobi_params={"LogToConsole": 0}
+    )
+elif args.solver == "mip":
+    from rockmate.ILP_MIP import ModelMIP
+
+    get_ilp = lambda kg, bd, sbd: ModelMIP(kg, bd, sbd, gcd=10000)
+else:
+    from rockmate.ILP_HiGHS import ModelHiGHS
+
+    get_ilp = lambda kg, bd, sbd: ModelHiGHS(
+        kg, bd, sbd, gcd=10000, highs_params={"disp": False}
+    )
+
+
+def sched_time(md, kg):
+    fwd_sched, bwd_sched = md.schedule(kg)
+    return fwd_sched.time + bwd_sched.time
+
+
+model = get_GPT(model=args.model)
+sample = [torch.randint(0, 600, [args.batch_size, args.seq_len])]
+rkgb_res = rkgb.make_all_graphs(model, sample, verbose=False, bool_kg=True)
+print(
+    f"{'block':>6} {'budget':>7} {'abar':>7} {'heur':>5} {'ilp':>5} "
+    f"{'slowdown':>9} {'heur (s)':>9} {'ilp (s)':>9}"
+)
+total = {"heur": 0, "ilp": 0, "n": 0}
+for b, kg in enumerate(rkgb_res.K_graph_list):
+    max_bdg = sum(kdn.mem for kdn in kg.list_kdn) + max(
+        kcn.overhead for kcn in kg.list_kcn
+    )
+    for bd_all in np.linspace(max_bdg / 4, max_bdg, args.nb_budget_all):
+        l_bd_abar = np.linspace(
+            kg.output_kdn_data.mem, bd_all, args.nb_budget_abar
+        )
+        for bd_abar in l_bd_abar[::-1]:
+            heur = ModelHeuristic(kg, bd_all, bd_abar)
+            heur.solve()
+            ilp = get_ilp(kg, bd_all, bd_abar)
+            ilp.solve()
+            slowdown = ""
+            if heur.feasible and ilp.feasible:
+                ratio = sched_time(heur, kg) / sched_time(ilp, kg) - 1
+                slowdown = f"{ratio:.2%}"
+            total["heur"] += bool(heur.feasible)
+            total["ilp"] += bool(ilp.feasible)
+            total["n"] += 1
+            print(
+                f"{b:>6} {bd_all / max_bdg:>7.0%} {bd_abar / bd_all:>7.0%} "
+                f"{str(bool(heur.feasible)):>5} {str(bool(ilp.feasible)):>5} "
+                f"{slowdown:>9} {heur.solve_time:>9.3f} {ilp.solve_time:>9.3f}"
+            )
+print(
+    f"feasible: heuristic {total['heur']}/{total['n']}, "
+    f"ILP {total['ilp']}/{total['n']}"
+)
@@ -0,0 +1,54 @@
+import time
+import argparse
+import torch
+import rkgb
+from rockmate.models import get_GPT
+import sys
+sys.setrecursionlimit(10000)
+
+'''Benchmark of the construction time of the block ILP.
+
+The K_graphs of a GPT model are built with rkgb, then for each block
+the ILP model (ModelGurobi or ModelMIP) is created with the largest
+budget used by get_rk_block, and we report the number of K_C_nodes,
+of K_D_nodes and of create/delete edges along with the time spent
+building the model (before any call to solve).
+'''
+
+parser = argparse.ArgumentParser("ILP construction benchmark")
+parser.add_argument(
+    "--models", nargs="+", default=["GPT2-small", "GPT2-medium"]
+)
+parser.add_argument("--solver", default="MIP", choices=["MIP", "mip"])
+parser.add_argument("--batch-size", type=int, default=2)
+parser.add_argument("--seq-len", type=int, default=128)
+args = parser.parse_args()
+
+if args.solver == "MIP":
+    from rockmate.ILP_gurobi_solver import ModelGurobi
+else:
+    from rockmate.ILP_MIP import ModelMIP
+
+print(
+    f"{'model':>12} {'block':>6} {'#kcn':>6} {'#kdn':>6} "
+    f"{'#create':>8} {'#delete':>8} {'build (s)':>10}"
+)
+for name in args.models:
+    model = get_GPT(model=name)
+    sample = [torch.randint(0, 600, [args.batch_size, args.seq_len])]
+    rkgb_res = rkgb.make_all_graphs(model, sample, verbose=False, bool_kg=True)
+    for b, kg in enumerate(rkgb_res.K_graph_list):
+        kdn_sizes = [kdn.mem for kdn in kg.list_kdn]
+        overheads = [kcn.overhead for kcn in kg.list_kcn]
+        max_bdg = sum(kdn_sizes) + max(overheads)
+        start = time.time()
+        if args.solver == "MIP":
+            md = ModelGurobi(kg, max_bdg, max_bdg, gcd=10000)
+        else:
+            md = ModelMIP(kg, max_bdg, max_bdg, gcd=10000)
+        build_time = time.time() - start
+        print(
+            f"{name:>12} {b:>6} {len(kg.list_kcn):>6} {len(kg.list_kdn):>6} "
+            f"{len(md.create_list):>8} {len(md.delete_list):>8} "
+            f"{build_time:>10.3f}"
+        )
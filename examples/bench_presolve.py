@@ -0,0 +1,82 @@
+import time
+import argparse
+import torch
+import rkgb
+from rockmate.models import get_GPT
+from rockmate.presolve import Coarse_K_graph, Presolved_Model
+import sys
+sys.setrecursionlimit(10000)
+
+'''Benchmark of the presolve of the block ILPs.
+
+The K_graphs of a GPT model are built with rkgb. For each block and
+each merge threshold, consecutive cheap K_C_nodes are merged by
+Coarse_K_graph, and we report the number of K_C_nodes and of ILP
+variables before and after, the time to build and solve the ILP at a
+budget between the smallest and the largest one, and the time of the
+expanded schedule relative to the exact one (threshold 0).
+'''
+
+parser = argparse.ArgumentParser("ILP presolve benchmark")
+parser.add_argument("--model", default="GPT2-small")
+parser.add_argument(
+    "--thresholds", type=float, nargs="+", default=[0, 0.01, 0.02, 0.05]
+)
+parser.add_argument(
+    "--solver", default="HiGHS", choices=["MIP", "mip", "HiGHS"]
+)
+parser.add_argument("--budget", type=float, default=0.5)
+parser.add_argument("--batch-size", type=int, default=2)
+parser.add_argument("--seq-len", type=int, default=128)
+args = parser.parse_args()
+
+if args.solver == "MIP":
+    from rockmate.ILP_gurobi_solver import ModelGurobi
+
+    get_ilp = lambda kg, bd, sbd: ModelGurobi(
+        kg, bd, sbd, gcd=10000, gurobi_params={"LogToConsole": 0}
+    )
+elif args.solver == "mip":
+    from rockmate.ILP_MIP import ModelMIP
+
+    get_ilp = lambda kg, bd, sbd: ModelMIP(kg, bd, sbd, gcd=10000)
+else:
+    from rockmate.ILP_HiGHS import ModelHiGHS
+
+    get_ilp = lambda kg, bd, sbd: ModelHiGHS(
+        kg, bd, sbd, gcd=10000, highs_params={"disp": False}
+    )
+
+model = get_GPT(model=args.model)
+sample = [torch.randint(0, 600, [args.batch_size, args.seq_len])]
+rkgb_res = rkgb.make_all_graphs(model, sample, verbose=False, bool_kg=True)
+print(
+    f"{'block':>6} {'thresh':>7} {'#kcn':>6} {'#vars':>9} {'reduction':>10} "
+    f"{'build (s)':>10} {'solve (s)':>10} {'slowdown':>9}"
+)
+for b, kg in enumerate(rkgb_res.K_graph_list):
+    max_bdg = sum(kdn.mem for kdn in kg.list_kdn) + max(
+        kcn.overhead for kcn in kg.list_kcn
+    )
+    budget = max_bdg * args.budget
+    exact = None
+    for threshold in args.thresholds:
+        start = time.time()
+        ckg = Coarse_K_graph(kg, threshold)
+        md = Presolved_Model(get_ilp(ckg, budget, budget), ckg)
+        build_time = time.time() - start
+        md.solve()
+        slowdown = ""
+        if md.feasible:
+            fwd_sched, bwd_sched = md.schedule(kg)
+            sched_time = fwd_sched.time + bwd_sched.time
+            if exact is None and threshold == 0:
+                exact = sched_time
+            if exact:
+                slowdown = f"{sched_time / exact - 1:.2%}"
+        nb_vars, nb_coarse_vars = ckg.nb_vars
+        print(
+            f"{b:>6} {threshold:>7} {len(ckg.list_kcn):>6} "
+            f"{nb_coarse_vars:>9} {1 - nb_coarse_vars / nb_vars:>10.1%} "
+            f"{build_time:>10.3f} {md.solve_time:>10.3f} {slowdown:>9}"
+        )
@@ -0,0 +1,73 @@
+import random
+import time
+import argparse
+from rockmate.rotor_solver import nsolve_dp_functionnal, window_error_bound
+
+'''Benchmark of the bounded-lookback (approximate) rotor DP.
+
+Random chains are generated with the same fields as an RK_Chain, then
+solved exactly (nsolve_dp_functionnal, which gives the same table as
+psolve_dp_functionnal) and with several windows. For each window, we
+report the solve time, the relative slowdown of the approximate schedule
+compared to the exact one, and the guaranteed bound on this slowdown
+given by window_error_bound, which does not need the exact solve.
+'''
+
+parser = argparse.ArgumentParser("Rotor window benchmark")
+parser.add_argument("--lengths", type=int, nargs="+", default=[25, 50, 100])
+parser.add_argument("--windows", type=int, nargs="+", default=[2, 4, 8, 16])
+parser.add_argument("--nb-sol", type=int, default=4)
+parser.add_argument("--mmax", type=int, default=1000)
+parser.add_argument("--seed", type=int, default=0)
+args = parser.parse_args()
+
+
+class SyntheticChain:
+    def __init__(self, ln, nb_sol, seed=0, scale=20):
+        r = random.Random(seed)
+        self.ln = ln
+        self.nb_sol = [r.randint(1, nb_sol) for _ in range(ln)] + [1]
+        self.fw = [[r.uniform(1, 10) for _ in range(n)] for n in self.nb_sol]
+        self.bw = [[r.uniform(1, 20) for _ in range(n)] for n in self.nb_sol]
+        self.cw = [r.randint(1, scale) for _ in range(ln + 1)] + [0]
+        self.cbw = [[]] + [
+            [r.randint(0, 3 * scale) for _ in range(n)] for n in self.nb_sol
+        ]
+        self.fwd_tmp = [
+            [r.randint(0, scale) for _ in range(n)] for n in self.nb_sol
+        ]
+        self.bwd_tmp = [
+            [r.randint(0, scale) for _ in range(n)] for n in self.nb_sol
+        ]
+        self.ff_fwd_tmp = [r.randint(0, scale) for _ in range(ln + 1)]
+        self.ff_fw = [r.uniform(0.5, 8) for _ in range(ln + 1)]
+        # -> for the Loss block
+        self.fw[-1], self.bw[-1], self.cbw[-1] = [0], [0], [0]
+        self.fwd_tmp[-1], self.bwd_tmp[-1] = [0], [0]
+        self.ff_fwd_tmp[-1], self.ff_fw[-1] = 0, 0
+
+
+print(f"{'ln':>5} {'window':>7} {'time (s)':>9} {'slowdown':>9} {'bound':>9}")
+for ln in args.lengths:
+    chain = SyntheticChain(ln, args.nb_sol, seed=args.seed)
+    # -> budget between storing nothing and storing everything
+    mmax = min(args.mmax, sum(chain.cw) + sum(max(l) for l in chain.cbw[1:]))
+    start = time.time()
+    exact = nsolve_dp_functionnal(chain, mmax)[0][mmax, 0, ln]
+    print(f"{ln:>5} {'exact':>7} {time.time() - start:>9.3f}")
+    for window in args.windows:
+        start = time.time()
+        opt_table = nsolve_dp_functionnal(chain, mmax, window=window)
+        solve_time = time.time() - start
+        approx = opt_table[0][mmax, 0, ln]
+        bound = window_error_bound(chain, mmax, window, opt_table)[mmax]
+        if exact == float("inf"):
+            # -> then approx is inf too, and there is nothing to bound
+            slowdown, bound = "infeasible", ""
+        else:
+            slowdown = f"{approx / exact - 1:.2%}"
+            bound = f"{bound / exact:.2%}"
+        print(
+            f"{ln:>5} {window:>7} {solve_time:>9.3f} "
+            f"{slowdown:>9} {bound:>9}"
+        )
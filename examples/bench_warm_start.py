@@ -0,0 +1,57 @@
+import time
+import argparse
+import numpy as np
+import torch
+import rkgb
+from rockmate.models import get_GPT
+import sys
+sys.setrecursionlimit(10000)
+
+'''Benchmark of MIP warm starts across the abar budgets of a block.
+
+For each K_graph of a GPT model, the block ILP is built once with the
+largest budget, then solved for decreasing save budgets (as done by
+get_rk_solution), with and without giving the previous solution as a
+MIP start. We report the time of each solve and the total.
+'''
+
+parser = argparse.ArgumentParser("Warm start benchmark")
+parser.add_argument("--model", default="GPT2-small")
+parser.add_argument("--solver", default="MIP", choices=["MIP", "mip"])
+parser.add_argument("--nb-budget-save", type=int, default=10)
+parser.add_argument("--batch-size", type=int, default=2)
+parser.add_argument("--seq-len", type=int, default=128)
+args = parser.parse_args()
+
+if args.solver == "MIP":
+    from rockmate.ILP_gurobi_solver import ModelGurobi as Model
+    params = {"gurobi_params": {"LogToConsole": 0, "IntegralityFocus": 1}}
+else:
+    from rockmate.ILP_MIP import ModelMIP as Model
+    params = {}
+
+model = get_GPT(model=args.model)
+sample = [torch.randint(0, 600, [args.batch_size, args.seq_len])]
+rkgb_res = rkgb.make_all_graphs(model, sample, verbose=False, bool_kg=True)
+for b, kg in enumerate(rkgb_res.K_graph_list):
+    kdn_sizes = [kdn.mem for kdn in kg.list_kdn]
+    overheads = [kcn.overhead for kcn in kg.list_kcn]
+    max_bdg = sum(kdn_sizes) + max(overheads)
+    l_bd_abar = np.linspace(
+        kg.output_kdn_data.mem, max_bdg, args.nb_budget_save
+    )
+    for warm_start in [False, True]:
+        md = Model(kg, max_bdg, max_bdg, gcd=10000, warm_start=warm_start,
+                   **params)
+        if args.solver == "mip":
+            md.md.verbose = 0
+        start = time.time()
+        for bd_abar in np.sort(l_bd_abar)[::-1]:
+            md.add_abar_constraint(bd_abar)
+            md.solve()
+        total = time.time() - start
+        times = " ".join(f"{t:.2f}" for t in md.solve_times)
+        print(
+            f"block {b} ({len(kg.list_kcn)} kcn) warm_start={warm_start}: "
+            f"total {total:.2f}s, per solve [{times}]"
+        )
@@ -28,6 +28,10 @@ def change_reasonable_rate(x):
 ref_test_phantoms_detection = [False]
 
 
+# -> solver used by python-mip in rockmate's ModelMIP
+solver_name = ["CBC"]
+
+
 # ==========================
 #  === LISTS OF FUNCTIONS ===
 # ==========================
@@ -0,0 +1,391 @@
+from typing import Dict, Any
+import time
+import numpy as np
+from scipy.optimize import milp, Bounds, LinearConstraint
+from scipy.sparse import csr_matrix
+from rockmate.def_op import RunOp, DelOp, OpSchedule
+
+
+class ModelHiGHS:
+    """
+    Same ILP as ModelGurobi, assembled directly as a scipy.sparse
+    constraint matrix and solved with the HiGHS solver bundled in scipy.
+    Variables are columns of a single vector: self.R, self.S, self.P,
+    self.create and self.delete are arrays of column indices, with the
+    same shapes as the variable tensors of the other models.
+    scipy.optimize.milp takes no MIP start, so there is no warm_start.
+    """
+
+    def __init__(
+        self,
+        kg,
+        budget: int,
+        save_budget: int,
+        highs_params: Dict[str, Any] = {},
+        gcd=None,
+    ):
+        self.kg = kg
+        self.time = [kcn.time for kcn in self.kg.list_kcn]
+        self.gcd = gcd if gcd else 1
+        self.budget = budget / self.gcd
+        self.save_budget = save_budget / self.gcd
+        self.overhead = [kcn.overhead / self.gcd for kcn in self.kg.list_kcn]
+        self.mem = [kdn.mem / self.gcd for kdn in self.kg.list_kdn]
+        self.highs_params = highs_params
+        self.feasible = None
+        self.solve_time = None
+        self.solve_times = []
+        # -> relative gap to the best bound of the last solution
+        self.gap = None
+
+        self.output_indices = [
+            self.kg.list_kdn.index(n) for n in [self.kg.output_kdn_grad]
+        ]
+        self.protected_indices = []
+        self.loss_idx = self.kg.list_kcn.index(self.kg.loss_kcn)
+        T = len(self.kg.list_kcn)
+        I = len(self.kg.list_kdn)
+        kcn_idx = {kcn.name: k for k, kcn in enumerate(self.kg.list_kcn)}
+        kdn_idx = {kdn.name: i for i, kdn in enumerate(self.kg.list_kdn)}
+
+        _deps_d = [ # kdn's parents
+            [kcn_idx[kcn.name] for kcn in self.kg.list_kdn[i].deps]
+            for i in range(I)
+        ]
+        _users_d = [ # kdn's children
+            [
+                kcn_idx[kcn.name]
+                for kcn in self.kg.list_kdn[i].users_real
+                if kcn.name in kcn_idx
+            ]
+            for i in range(I)
+        ]
+        _users_c = [ # kcn's children
+            [kdn_idx[kdn.name] for kdn in self.kg.list_kcn[i].users]
+            for i in range(T)
+        ]
+
+        self.create_list = [ # out-edges from kcns
+            (k, i)
+            for k, kcn in enumerate(self.kg.list_kcn)
+            for i in _users_c[k]
+        ]
+        self.delete_list = [ # in-edges to and out-edges from kdns
+            (k, i)
+            for i, kdn in enumerate(self.kg.list_kdn)
+            for k in _deps_d[i] + _users_d[i]
+        ]
+        self.create_by_k = [[] for _ in range(T)]  # k -> [(eidx, i)]
+        self.delete_by_k = [[] for _ in range(T)]
+        _create_by_i = [[] for _ in range(I)]  # i -> [(k, eidx)]
+        _delete_by_i = [[] for _ in range(I)]
+        for eidx, (k, i) in enumerate(self.create_list):
+            self.create_by_k[k].append((eidx, i))
+            _create_by_i[i].append((k, eidx))
+        for eidx, (k, i) in enumerate(self.delete_list):
+            self.delete_by_k[k].append((eidx, i))
+            _delete_by_i[i].append((k, eidx))
+        _create_set = set(self.create_list)
+        _delete_idx = {}
+        for eidx, edge in enumerate(self.delete_list):
+            _delete_idx.setdefault(edge, eidx)
+
+        Cr = len(self.create_list)
+        De = len(self.delete_list)
+        # ======build varaibles======
+        # -> column indices of each variable tensor
+        sizes = [T * T, T * Cr, T * I, T * Cr, T * De]
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.nb_vars = int(offsets[-1])
+        self.R = np.arange(offsets[0], offsets[1]).reshape(T, T)
+        self.S = np.arange(offsets[1], offsets[2]).reshape(T, Cr)
+        self.P = np.arange(offsets[2], offsets[3]).reshape(T, I)
+        self.create = np.arange(offsets[3], offsets[4]).reshape(T, Cr)
+        self.delete = np.arange(offsets[4], offsets[5]).reshape(T, De)
+        # -> all variables are binary, the equalities to 0 or 1
+        # -> of the other models are set through their bounds
+        self.var_lb = np.zeros(self.nb_vars)
+        self.var_ub = np.ones(self.nb_vars)
+
+        # define objective function
+        self.c = np.zeros(self.nb_vars)
+        self.c[self.R] = np.array(self.time)[None, :]
+
+        # ======build constraints======
+        # -> rows are stored in COO format, as (cols, coefs, lb, ub)
+        rows, cols, vals = [], [], []
+        row_lb, row_ub = [], []
+
+        def add_row(expr, lb=-np.inf, ub=np.inf):
+            r_cols, r_vals = expr
+            rows.extend([len(row_lb)] * len(r_cols))
+            cols.extend(r_cols)
+            vals.extend(r_vals)
+            row_lb.append(lb)
+            row_ub.append(ub)
+            return len(row_lb) - 1
+
+        def expr_sum(*exprs):
+            # -> each expr is (cols, coefs), sums are concatenations
+            # -> (csr_matrix adds up duplicate entries)
+            return (
+                [c for e in exprs for c in e[0]],
+                [v for e in exprs for v in e[1]],
+            )
+
+        def expr_neg(expr):
+            return (expr[0], [-v for v in expr[1]])
+
+        for t in range(T):
+            self.var_ub[self.R[t, t + 1 :]] = 0
+            self.var_lb[self.R[t, t]] = 1
+        for j in range(Cr):
+            self.var_ub[self.S[: self.create_list[j][0] + 1, j]] = 0
+        for i in range(I):
+            self.var_ub[self.P[: min(_deps_d[i]) + 1, i]] = 0
+        add_row(
+            (list(self.R[:, self.loss_idx]), [1] * T), 1, 1
+        )  # fwd_loss can only run once
+
+        for t in range(T):
+            for j in range(Cr):
+                add_row(
+                    ([self.S[t, j], self.P[t, self.create_list[j][1]]], [1, -1]),
+                    ub=0,
+                )
+        for t in range(T - 1):
+            for i in range(Cr):
+                add_row(
+                    (
+                        [
+                            self.S[t + 1, i],
+                            self.S[t, i],
+                            self.R[t, self.create_list[i][0]],
+                        ],
+                        [1, -1, -1],
+                    ),
+                    ub=0,
+                )
+        # ensure all computations are possible
+        for t in range(T):
+            for j, (k, i) in enumerate(self.create_list):
+                for k_ in _users_d[i]:
+                    add_row(
+                        (
+                            [self.R[t, k_], self.R[t, k], self.S[t, j]],
+                            [1, -1, -1],
+                        ),
+                        ub=0,
+                    )
+
+        def alive(t, k, i):
+            c_cols = [self.create[t, e] for k_, e in _create_by_i[i] if k_ <= k]
+            d_cols = [self.delete[t, e] for k_, e in _delete_by_i[i] if k_ <= k]
+            return (
+                [self.P[t, i]] + c_cols + d_cols,
+                [1] + [1] * len(c_cols) + [-1] * len(d_cols),
+            )
+
+        for t in range(T):
+            for eidx, (k, i) in enumerate(self.delete_list):
+                alive_tki = alive(t, k, i)
+                add_row(alive_tki, 0, 1)
+                if (k, i) in _create_set:
+                    didx = _delete_idx[(k, i)]
+                    add_row(
+                        expr_sum(
+                            alive_tki,
+                            ([self.delete[t, didx], self.R[t, k]], [1, -1]),
+                        ),
+                        lb=0,
+                    )
+
+            for eidx, (k, i) in enumerate(self.create_list):
+                add_row(
+                    ([self.create[t, eidx], self.R[t, k]], [1, -1]), ub=0
+                )
+            for i in range(I):
+                alive_last = alive(t, max(_deps_d[i] + _users_d[i]), i)
+                if t + 1 < T:
+                    add_row(
+                        expr_sum(([self.P[t + 1, i]], [1]), expr_neg(alive_last)),
+                        0,
+                        0,
+                    )
+                else:
+                    # in the end of bwd, del everything
+                    add_row(alive_last, 0, 0)
+
+        # don't delete if still needed
+        # -> max_hazards * (1 - delete) >= num_hazards, with
+        # -> num_hazards = 1 - R[t,k] (+ P[t+1,i]) + sum R[t,j], j>k
+        for t in range(T):
+            for eidx, (k, i) in enumerate(self.delete_list):
+                later_users = [j for j in _users_d[i] if j > k]
+                max_hazards = len(later_users) + (2 if t + 1 < T else 1)
+                if i in self.protected_indices:
+                    self.var_ub[self.delete[t, eidx]] = 0
+                    continue
+                r_cols = [self.delete[t, eidx], self.R[t, k]]
+                r_vals = [-max_hazards, 1]
+                if t + 1 < T:
+                    r_cols.append(self.P[t + 1, i])
+                    r_vals.append(-1)
+                r_cols += [self.R[t, j] for j in later_users]
+                r_vals += [-1] * len(later_users)
+                add_row((r_cols, r_vals), lb=1 - max_hazards)
+
+        # -> U[(t,k)] is the memory used after the k-th step of phase t,
+        # -> accumulated as a dict col -> coef along k
+        # -> peak and save budgets are set as upper bounds of
+        # -> these rows, so they can be changed between solves
+        self.budget_rows = []
+        self.save_rows = []
+        for t in range(T):
+            U = {}
+            for i in range(I):
+                U[self.P[t, i]] = self.mem[i]
+            for k in range(T):
+                sign = 1 if k == 0 else -1
+                for eidx, i in self.create_by_k[k]:
+                    col = self.create[t, eidx]
+                    U[col] = U.get(col, 0) + self.mem[i]
+                for eidx, i in self.delete_by_k[k]:
+                    col = self.delete[t, eidx]
+                    U[col] = U.get(col, 0) + sign * self.mem[i]
+                U_tk = (list(U.keys()), list(U.values()))
+                add_row(U_tk, lb=0)
+                peak = dict(U)
+                peak[self.R[t, k]] = peak.get(self.R[t, k], 0) + self.overhead[k]
+                for eidx_d, i_ in self.delete_by_k[k]:
+                    col = self.delete[t, eidx_d]
+                    peak[col] = peak.get(col, 0) + self.mem[i_]
+                self.budget_rows.append(
+                    add_row((list(peak.keys()), list(peak.values())))
+                )
+                if t == T // 2:
+                    self.save_rows.append(add_row(U_tk))
+
+        self.A = csr_matrix(
+            (vals, (rows, cols)), shape=(len(row_lb), self.nb_vars)
+        )
+        self.row_lb = np.array(row_lb, dtype=float)
+        self.row_ub = np.array(row_ub, dtype=float)
+        self.row_ub[self.budget_rows] = self.budget
+        if self.save_budget:
+            self.row_ub[self.save_rows] = self.save_budget
+
+    def set_budget(self, budget):
+        self.budget = budget / self.gcd
+        self.row_ub[self.budget_rows] = self.budget
+
+    def add_abar_constraint(self, save_budget):
+        # -> replaces the previous save_budget, as in the other models
+        self.save_budget = save_budget / self.gcd
+        self.row_ub[self.save_rows] = self.save_budget
+
+    def solve(self, time_limit=None, mip_gap=None):
+        # time_limit: in seconds, the incumbent is kept if it is reached
+        # mip_gap: stop once the relative gap is below mip_gap
+        options = dict(self.highs_params)
+        if time_limit is not None:
+            options["time_limit"] = time_limit
+        if mip_gap is not None:
+            options["mip_rel_gap"] = mip_gap
+        start = time.time()
+        res = milp(
+            self.c,
+            integrality=np.ones(self.nb_vars),
+            bounds=Bounds(self.var_lb, self.var_ub),
+            constraints=LinearConstraint(self.A, self.row_lb, self.row_ub),
+            options=options,
+        )
+        self.solve_time = time.time() - start
+        self.solve_times.append(self.solve_time)
+        self.status = res.status
+
+        infeasible = res.status == 2
+        if infeasible:
+            self.feasible = False
+        elif res.status == 1 and res.x is None:
+            # -> time limit reached before any incumbent
+            self.feasible = False
+        else:
+            if res.x is None:
+                raise ValueError(
+                    "Model status is {}, but there is no solution: {}".format(
+                        res.status, res.message
+                    )
+                )
+            self.feasible = True
+            self.gap = res.mip_gap
+            self.x = np.round(res.x).astype(bool)
+
+    def schedule(self, kg=None):
+        kg = kg if kg else self.kg
+        assert self.feasible, "Cannot schedule an infeasible model!"
+        T = len(kg.list_kcn)
+        I = len(kg.list_kdn)
+
+        op_list = []
+        alive_list = []
+        alive_status = np.zeros(I + 2, dtype=bool)
+        alive_status[-1] = 1  # input_data_kdn
+        output_grad_idx = [kdn.name for kdn in kg.list_kdn].index(
+            kg.output_kdn_grad.name
+        )
+        R, create, delete = (
+            self.x[self.R],
+            self.x[self.create],
+            self.x[self.delete],
+        )
+        for t in range(T):
+            # -> only the nonzero entries of stage t, bucketed by k
+            created = {}
+            for eidx in np.flatnonzero(create[t]):
+                k, i = self.create_list[eidx]
+                created.setdefault(k, []).append(i)
+            deleted = {}
+            for eidx in np.flatnonzero(delete[t]):
+                k, i = self.delete_list[eidx]
+                deleted.setdefault(k, []).append(i)
+            for k in sorted(set(np.flatnonzero(R[t])) | deleted.keys()):
+                if R[t, k]:
+                    kcn = kg.list_kcn[k]
+                    if "loss" in kcn.name:
+                        op_list.append(RunOp(kcn))
+                        alive_list.append(alive_status.copy())
+                        alive_status[output_grad_idx] = 1
+                    alive_status[created.get(k, [])] = 1
+                    op_list.append(RunOp(kcn))
+                    alive_list.append(alive_status.copy())
+                # -> phantoms first
+                for phantom in [True, False]:
+                    for i in deleted.get(k, []):
+                        kdn = kg.list_kdn[i]
+                        if ("phantom" in kdn.name) == phantom:
+                            alive_status[i] = 0
+                            op_list.append(DelOp(kdn))
+                            alive_list.append(alive_status.copy())
+        for i, op in enumerate(op_list):
+            if "loss" in op.name:
+                loss_i = i
+                break
+
+        fwd_sched = OpSchedule(
+            op_list[: loss_i + 1],
+            alive_list[: loss_i + 1],
+            kg.input_kdn_data,
+            kg.input_kdn_grad,
+            kg.output_kdn_data,
+            kg.list_kdn,
+        )
+        bwd_sched = OpSchedule(
+            op_list[loss_i + 1 :],
+            alive_list[loss_i + 1 :],
+            kg.input_kdn_data,
+            kg.input_kdn_grad,
+            kg.output_kdn_data,
+            kg.list_kdn,
+        )
+        return fwd_sched, bwd_sched
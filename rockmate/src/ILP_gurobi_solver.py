@@ -1,6 +1,7 @@
 # import logging
 # import math
 from typing import Dict, Any
+import time
 import numpy as np
 from gurobipy import GRB, Model, quicksum
 from rockmate.def_op import RunOp, DelOp, OpSchedule
@@ -18,6 +19,7 @@ class ModelGurobi:
         save_budget: int,
         gurobi_params: Dict[str, Any] = {},
         gcd=None,
+        warm_start=True,
     ):
         self.kg = kg
         self.time = [kcn.time for kcn in self.kg.list_kcn]
@@ -29,6 +31,12 @@ class ModelGurobi:
         self.gurobi_params = gurobi_params
         self.feasible = None
         self.solve_time = None
+        self.solve_times = []
+        # -> relative gap to the best bound of the last solution
+        self.gap = None
+        # warm_start: give the last feasible solution as a MIP start
+        self.warm_start = warm_start
+        self.start = None
 
         self.output_indices = [
             self.kg.list_kdn.index(n) for n in [self.kg.output_kdn_grad]
@@ -38,23 +46,30 @@ class ModelGurobi:
         self.loss_idx = self.kg.list_kcn.index(self.kg.loss_kcn)
         T = len(self.kg.list_kcn)
         I = len(self.kg.list_kdn)
+        # name -> position, instead of list.index() for every edge
+        kcn_idx = {kcn.name: k for k, kcn in enumerate(self.kg.list_kcn)}
+        kdn_idx = {kdn.name: i for i, kdn in enumerate(self.kg.list_kdn)}
 
         self.md = Model(f"rockmateMILP_{T}_{budget}")
         if gurobi_params is not None:
             for k, v in gurobi_params.items():
                 setattr(self.md.Params, k, v)
+        # -> used by solve when no limit is given (GRB.INFINITY and
+        # -> 1e-4 unless gurobi_params sets them)
+        self.default_time_limit = self.md.Params.TimeLimit
+        self.default_mip_gap = self.md.Params.MIPGap
 
         _deps_d = [ # kdn's parents
-            [self.kg.list_kcn.index(kcn) for kcn in self.kg.list_kdn[i].deps]
+            [kcn_idx[kcn.name] for kcn in self.kg.list_kdn[i].deps]
             for i in range(I)
         ]
         # _deps_c = [[self.kg.list_kdn.index(kdn)
         #             for kdn in self.kg.list_kcn[i].deps_real] for i in range(T)]
         _users_d = [ # kdn's children
             [
-                self.kg.list_kcn.index(kcn)
+                kcn_idx[kcn.name]
                 for kcn in self.kg.list_kdn[i].users_real
-                if kcn in self.kg.list_kcn
+                if kcn.name in kcn_idx
             ]
             for i in range(I)
         ]
@@ -62,7 +77,7 @@ class ModelGurobi:
         # return [self.kg.list_kcn.index(kcn)
         #         for kcn in self.kg.list_kdn[i].users_real]
         _users_c = [ # kcn's children
-            [self.kg.list_kdn.index(kdn) for kdn in self.kg.list_kcn[i].users]
+            [kdn_idx[kdn.name] for kdn in self.kg.list_kcn[i].users]
             for i in range(T)
         ]
 
@@ -76,21 +91,74 @@ class ModelGurobi:
             for i, kdn in enumerate(self.kg.list_kdn)
             for k in _deps_d[i] + _users_d[i]
         ]
+        # edges bucketed by kcn and by kdn, to avoid scanning the
+        # whole create/delete lists inside the loops over t and k
+        self.create_by_k = [[] for _ in range(T)]  # k -> [(eidx, i)]
+        self.delete_by_k = [[] for _ in range(T)]
+        _create_by_i = [[] for _ in range(I)]  # i -> [(k, eidx)]
+        _delete_by_i = [[] for _ in range(I)]
+        for eidx, (k, i) in enumerate(self.create_list):
+            self.create_by_k[k].append((eidx, i))
+            _create_by_i[i].append((k, eidx))
+        for eidx, (k, i) in enumerate(self.delete_list):
+            self.delete_by_k[k].append((eidx, i))
+            _delete_by_i[i].append((k, eidx))
+        _create_set = set(self.create_list)
+        _delete_idx = {}
+        for eidx, edge in enumerate(self.delete_list):
+            _delete_idx.setdefault(edge, eidx)
 
-        Cr = len(self.create_list)
-        De = len(self.delete_list)
         # ======build varaibles======
-        self.R = self.md.addVars(T, T, name="R", vtype=GRB.BINARY)
-        self.S = self.md.addVars(T, Cr, name="S", vtype=GRB.BINARY)
-        self.P = self.md.addVars(T, I, name="P", vtype=GRB.BINARY)
-        self.create = self.md.addVars(T, Cr, name="create", vtype=GRB.BINARY)
-        self.delete = self.md.addVars(T, De, name="delete", vtype=GRB.BINARY)
+        # -> only the possible ones: R[t, k] for k <= t, S[t, j] after
+        # -> the K_C_node of create_list[j], create/delete[t, j] from
+        # -> their K_C_node and P[t, i] after the first producer of i;
+        # -> the others are 0, as given by the getters below
+        self.R = self.md.addVars(
+            [(t, k) for t in range(T) for k in range(t + 1)],
+            name="R",
+            vtype=GRB.BINARY,
+        )
+        self.S = self.md.addVars(
+            [
+                (t, j)
+                for j, (k, _) in enumerate(self.create_list)
+                for t in range(k + 1, T)
+            ],
+            name="S",
+            vtype=GRB.BINARY,
+        )
+        self.P = self.md.addVars(
+            [(t, i) for i in range(I) for t in range(min(_deps_d[i]) + 1, T)],
+            name="P",
+            vtype=GRB.BINARY,
+        )
+        self.create = self.md.addVars(
+            [
+                (t, j)
+                for j, (k, _) in enumerate(self.create_list)
+                for t in range(k, T)
+            ],
+            name="create",
+            vtype=GRB.BINARY,
+        )
+        self.delete = self.md.addVars(
+            [
+                (t, j)
+                for j, (k, _) in enumerate(self.delete_list)
+                for t in range(k, T)
+            ],
+            name="delete",
+            vtype=GRB.BINARY,
+        )
+        R = lambda t, k: self.R.get((t, k), 0)
+        S = lambda t, j: self.S.get((t, j), 0)
+        P = lambda t, i: self.P.get((t, i), 0)
+        create = lambda t, j: self.create.get((t, j), 0)
+        delete = lambda t, j: self.delete.get((t, j), 0)
 
         # define objective function
         self.md.setObjective(
-            quicksum(
-                self.R[t, i] * self.time[i] for t in range(T) for i in range(T)
-            )
+            quicksum(self.R[t, i] * self.time[i] for t, i in self.R)
             # + quicksum(
             #     self.delete[t, k] * (T - t) / T * 0.1 * max(self.time)
             #     for t in range(T)
@@ -101,78 +169,57 @@ class ModelGurobi:
         )
 
         # ======build constraints======
-        self.md.addLConstr(
-            quicksum(self.R[t, i] for t in range(T) for i in range(t + 1, T)),
-            GRB.EQUAL,
-            0,
-        )
-        self.md.addLConstr(
-            quicksum(
-                self.S[t, j]
-                for j in range(Cr)
-                for t in range(self.create_list[j][0] + 1)
-            ),
-            GRB.EQUAL,
-            0,
-        )
-        self.md.addLConstr(
-            quicksum(
-                self.P[t, i]
-                for i in range(I)
-                for t in range(min(_deps_d[i]) + 1)
-            ),
-            GRB.EQUAL,
-            0,
-        )
         self.md.addLConstr(
             quicksum(self.R[t, t] for t in range(T)), GRB.EQUAL, T
         )
         self.md.addLConstr(
-            quicksum(self.R[t, self.loss_idx] for t in range(T)), GRB.EQUAL, 1
+            quicksum(self.R[t, self.loss_idx] for t in range(self.loss_idx, T)),
+            GRB.EQUAL,
+            1,
         )  # fwd_loss can only run once
 
-        for t in range(T):
-            for j in range(Cr):
-                self.md.addLConstr(
-                    self.S[t, j],
-                    GRB.LESS_EQUAL,
-                    self.P[t, self.create_list[j][1]],
-                )
-        for t in range(T - 1):
-            for i in range(Cr):
-                self.md.addLConstr(
-                    self.S[t + 1, i],
-                    GRB.LESS_EQUAL,
-                    self.S[t, i] + self.R[t, self.create_list[i][0]],
-                )
+        for t, j in self.S:
+            self.md.addLConstr(
+                self.S[t, j],
+                GRB.LESS_EQUAL,
+                self.P[t, self.create_list[j][1]],
+            )
+        for t, j in self.S:
+            self.md.addLConstr(
+                self.S[t, j],
+                GRB.LESS_EQUAL,
+                S(t - 1, j) + R(t - 1, self.create_list[j][0]),
+            )
         # ensure all computations are possible
         for t in range(T):
             for j, (k, i) in enumerate(self.create_list):
                 for k_ in _users_d[i]:
-                    self.md.addLConstr(
-                        self.R[t, k_],
-                        GRB.LESS_EQUAL,
-                        self.R[t, k] + self.S[t, j],
-                    )
+                    if k_ <= t:
+                        self.md.addLConstr(
+                            self.R[t, k_],
+                            GRB.LESS_EQUAL,
+                            R(t, k) + S(t, j),
+                        )
 
         self.alive = {}
         for t in range(T):
             for eidx, (k, i) in enumerate(self.delete_list):
-                self.alive[(t, k, i)] = self.P[t, i]
-                self.alive[(t, k, i)] += quicksum(
-                    self.create[t, eidx_c]
-                    for eidx_c, (k_, i_) in enumerate(self.create_list)
-                    if i_ == i and k_ <= k
+                self.alive[(t, k, i)] = P(t, i) + quicksum(
+                    create(t, eidx_c)
+                    for k_, eidx_c in _create_by_i[i]
+                    if k_ <= k
                 )
                 self.alive[(t, k, i)] -= quicksum(
-                    self.delete[t, eidx_d]
-                    for eidx_d, (k_, i_) in enumerate(self.delete_list)
-                    if i_ == i and k_ <= k
+                    delete(t, eidx_d)
+                    for k_, eidx_d in _delete_by_i[i]
+                    if k_ <= k
                 )
+                if self.alive[(t, k, i)].size() == 0:
+                    continue
                 self.md.addLConstr(self.alive[(t, k, i)], GRB.GREATER_EQUAL, 0)
                 self.md.addLConstr(self.alive[(t, k, i)], GRB.LESS_EQUAL, 1)
-                if (k, i) in self.create_list:
-                    didx = self.delete_list.index((k, i))
+                if (k, i) in _create_set and k <= t:
+                    didx = _delete_idx[(k, i)]
                     self.md.addLConstr(
                         self.alive[(t, k, i)] + self.delete[t, didx],
                         GRB.GREATER_EQUAL,
@@ -180,23 +227,18 @@ class ModelGurobi:
                     )
 
             for eidx, (k, i) in enumerate(self.create_list):
-                self.md.addLConstr(
-                    self.create[t, eidx], GRB.LESS_EQUAL, self.R[t, k]
-                )
-            for i in range(I):
-                if t + 1 < T:
+                if k <= t:
                     self.md.addLConstr(
-                        self.P[t + 1, i],
-                        GRB.EQUAL,
-                        self.alive[(t, max(_deps_d[i] + _users_d[i]), i)],
+                        self.create[t, eidx], GRB.LESS_EQUAL, self.R[t, k]
                     )
-                else:  # if i not in self.output_indices:
+            for i in range(I):
+                alive = self.alive[(t, max(_deps_d[i] + _users_d[i]), i)]
+                if t + 1 < T:
+                    if (t + 1, i) in self.P or alive.size() > 0:
+                        self.md.addLConstr(P(t + 1, i), GRB.EQUAL, alive)
+                elif alive.size() > 0:  # if i not in self.output_indices:
                     # in the end of bwd, del everything
-                    self.md.addLConstr(
-                        self.alive[(t, max(_deps_d[i] + _users_d[i]), i)],
-                        GRB.EQUAL,
-                        0,
-                    )
+                    self.md.addLConstr(alive, GRB.EQUAL, 0)
 
         def _num_hazards(t, i, k):
             if i in self.protected_indices:
@@ -204,14 +246,14 @@ class ModelGurobi:
             if t + 1 < T:
                 return (
                     1
-                    - self.R[t, k]
-                    + self.P[t + 1, i]
-                    + quicksum(self.R[t, j] for j in _users_d[i] if j > k)
+                    - R(t, k)
+                    + P(t + 1, i)
+                    + quicksum(R(t, j) for j in _users_d[i] if j > k)
                 )
             return (
                 1
-                - self.R[t, k]
-                + quicksum(self.R[t, j] for j in _users_d[i] if j > k)
+                - R(t, k)
+                + quicksum(R(t, j) for j in _users_d[i] if j > k)
             )
 
         def _max_num_hazards(t, i, k):
@@ -228,27 +270,25 @@ class ModelGurobi:
         #                             _num_hazards(t, i, k))
 
         # don't delete if still needed
-        for t in range(T):
-            for eidx, (k, i) in enumerate(self.delete_list):
-                self.md.addLConstr(
-                    _max_num_hazards(t, i, k) * (1 - self.delete[t, eidx]),
-                    GRB.GREATER_EQUAL,
-                    _num_hazards(t, i, k),
-                )
+        for t, eidx in self.delete:
+            k, i = self.delete_list[eidx]
+            self.md.addLConstr(
+                _max_num_hazards(t, i, k) * (1 - self.delete[t, eidx]),
+                GRB.GREATER_EQUAL,
+                _num_hazards(t, i, k),
+            )
 
         self.U = {}
         for t in range(T):
             self.U[(t, 0)] = (
-                quicksum(self.P[t, i] * self.mem[i] for i in range(I))
+                quicksum(P(t, i) * self.mem[i] for i in range(I))
                 + quicksum(
-                    self.create[t, eidx] * self.mem[i]
-                    for eidx, (k_, i) in enumerate(self.create_list)
-                    if k_ == 0
+                    create(t, eidx) * self.mem[i]
+                    for eidx, i in self.create_by_k[0]
                 )
                 + quicksum(
-                    self.delete[t, eidx] * self.mem[i]
-                    for eidx, (k_, i) in enumerate(self.delete_list)
-                    if k_ == 0
+                    delete(t, eidx) * self.mem[i]
+                    for eidx, i in self.delete_by_k[0]
                 )
             )
 
@@ -257,50 +297,75 @@ class ModelGurobi:
                 self.U[(t, k)] = (
                     self.U[(t, k - 1)]
                     + quicksum(
-                        self.create[t, eidx] * self.mem[i]
-                        for eidx, (k_, i) in enumerate(self.create_list)
-                        if k_ == k
+                        create(t, eidx) * self.mem[i]
+                        for eidx, i in self.create_by_k[k]
                     )
                     - quicksum(
-                        self.delete[t, eidx] * self.mem[i]
-                        for eidx, (k_, i) in enumerate(self.delete_list)
-                        if k_ == k
+                        delete(t, eidx) * self.mem[i]
+                        for eidx, i in self.delete_by_k[k]
                     )
                 )
+        # -> peak and save budgets are right-hand sides that can be
+        # -> updated in place, to re-solve the same model with others
+        self.budget_constrs = []
+        self.abar_constrs = []
         for t in range(T):
             for k in range(T):
                 self.md.addLConstr(self.U[(t, k)], GRB.GREATER_EQUAL, 0)
-                self.md.addLConstr(
+                constr = self.md.addLConstr(
                     self.U[(t, k)]
-                    + self.R[t, k] * self.overhead[k]
+                    + R(t, k) * self.overhead[k]
                     + quicksum(
-                        self.mem[i_] * self.delete[t, eidx_d]
-                        for eidx_d, (k_, i_) in enumerate(self.delete_list)
-                        if k == k_
+                        self.mem[i_] * delete(t, eidx_d)
+                        for eidx_d, i_ in self.delete_by_k[k]
                     ),
                     GRB.LESS_EQUAL,
                     self.budget,
                 )
-                if t == T // 2 and self.save_budget:
-                    self.md.addLConstr(
-                        self.U[(t, k)], GRB.LESS_EQUAL, self.save_budget
+                self.budget_constrs.append(constr)
+                if t == T // 2:
+                    constr = self.md.addLConstr(
+                        self.U[(t, k)],
+                        GRB.LESS_EQUAL,
+                        self.save_budget if self.save_budget else self.budget,
                     )
+                    self.abar_constrs.append(constr)
+
+    def set_budget(self, budget):
+        self.budget = budget / self.gcd
+        for constr in self.budget_constrs:
+            constr.RHS = self.budget
 
     def add_abar_constraint(self, save_budget):
-        T = len(self.kg.list_kcn)
+        # -> replaces the previous save_budget, which was only
+        # -> tightened before as budgets were given in decreasing order
         self.save_budget = save_budget / self.gcd
-        for k in range(T):
-            t = T // 2
-            self.md.addLConstr(self.U[(t, k)], GRB.LESS_EQUAL, self.save_budget)
-
-    def solve(self):
+        for constr in self.abar_constrs:
+            constr.RHS = self.save_budget
 
+    def solve(self, time_limit=None, mip_gap=None):
+        # time_limit: in seconds, the incumbent is kept if it is reached
+        # mip_gap: stop once the relative gap is below mip_gap
+        # -> both are set on every solve, as the model keeps them
+        self.md.Params.TimeLimit = (
+            self.default_time_limit if time_limit is None else time_limit
+        )
+        self.md.Params.MIPGap = (
+            self.default_mip_gap if mip_gap is None else mip_gap
+        )
         self.md.message("\n\nRestarting solve\n\n")
+        if self.warm_start and self.start is not None:
+            self.md.setAttr("Start", self.md.getVars(), self.start)
+        start = time.time()
         self.md.optimize()
+        self.solve_time = time.time() - start
+        self.solve_times.append(self.solve_time)
 
         infeasible = self.md.status == GRB.INFEASIBLE
         if infeasible:
             self.feasible = False
+        elif self.md.status == GRB.TIME_LIMIT and self.md.solCount < 1:
+            self.feasible = False
         else:
             if self.md.solCount < 1:
                 raise ValueError(
@@ -309,6 +374,25 @@ class ModelGurobi:
                     )
                 )
             self.feasible = True
+            self.gap = self.md.MIPGap
+            if self.warm_start:
+                self.start = self.md.getAttr("X", self.md.getVars())
+            # -> read once, for every call to schedule
+            T = len(self.kg.list_kcn)
+            self.solution = (
+                self.get_values(self.R, (T, T)),
+                self.get_values(self.create, (T, len(self.create_list))),
+                self.get_values(self.delete, (T, len(self.delete_list))),
+            )
+
+    def get_values(self, variables, shape):
+        # -> solution as a bool array, False where there is no variable
+        values = np.zeros(shape, dtype=bool)
+        keys = list(variables.keys())
+        if keys:
+            x = self.md.getAttr("X", [variables[key] for key in keys])
+            values[tuple(np.array(keys).T)] = np.array(x) > 0.5
+        return values
 
     def schedule(self, kg=None):
         kg = kg if kg else self.kg
@@ -320,34 +404,35 @@ class ModelGurobi:
         alive_list = []
         alive_status = np.zeros(I + 2, dtype=bool)
         alive_status[-1] = 1  # input_data_kdn
+        output_grad_idx = [kdn.name for kdn in kg.list_kdn].index(
+            kg.output_kdn_grad.name
+        )
+        R, create, delete = self.solution
         for t in range(T):
-            for k in range(T):
-                if self.R[t, k].X == 1:
+            # -> only the nonzero entries of stage t, bucketed by k
+            created = {}
+            for eidx in np.flatnonzero(create[t]):
+                k, i = self.create_list[eidx]
+                created.setdefault(k, []).append(i)
+            deleted = {}
+            for eidx in np.flatnonzero(delete[t]):
+                k, i = self.delete_list[eidx]
+                deleted.setdefault(k, []).append(i)
+            for k in sorted(set(np.flatnonzero(R[t])) | deleted.keys()):
+                if R[t, k]:
                     kcn = kg.list_kcn[k]
                     if "loss" in kcn.name:
                         op_list.append(RunOp(kcn))
                         alive_list.append(alive_status.copy())
-                        alive_status[kg.list_kdn.index(kg.output_kdn_grad)] = 1
-                        # alive_status[kg.list_kdn.index(kg.output_kdn_data)] = 0
-                    for eidx, (k_, i) in enumerate(self.create_list):
-                        if k == k_ and self.create[t, eidx].X == 1:
-                            alive_status[i] = 1
+                        alive_status[output_grad_idx] = 1
+                    alive_status[created.get(k, [])] = 1
                     op_list.append(RunOp(kcn))
                     alive_list.append(alive_status.copy())
-                    # for i in range(I):
-                    #     if self.alive[(t,k,i)].getValue():
-                    #         alive_list[-1][i] = 1
-                for eidx, (k_, i) in enumerate(self.delete_list):
-                    if k == k_ and self.delete[t, eidx].X == 1:
-                        kdn = kg.list_kdn[i]
-                        if "phantom" in kdn.name:
-                            alive_status[i] = 0
-                            op_list.append(DelOp(kdn))
-                            alive_list.append(alive_status.copy())
-                for eidx, (k_, i) in enumerate(self.delete_list):
-                    if k == k_ and self.delete[t, eidx].X == 1:
+                # -> phantoms first
+                for phantom in [True, False]:
+                    for i in deleted.get(k, []):
                         kdn = kg.list_kdn[i]
-                        if "phantom" not in kdn.name:
+                        if ("phantom" in kdn.name) == phantom:
                             alive_status[i] = 0
                             op_list.append(DelOp(kdn))
                             alive_list.append(alive_status.copy())
@@ -1,28 +1,43 @@
 from rkgb.utils.ast_add_on import make_str_assign, make_str_list_assign
 from rkgb.utils import np, torch
+from rkgb.utils import print_debug
 from rockmate.def_op import DelOp
+import time
+import bisect
+import textwrap
 
 # region Define Register Hooks
-def fct_get_pack(storage, no_save_list, sanity_check=False):
+def get_ptr_to_name(storage, no_save_list):
     # no_save_list contains a list of names
+    # -> data_ptr -> the first of them with this data
+    ptr_to_name = {}
+    for c in no_save_list:
+        ptr_to_name.setdefault(storage.ld[c].data_ptr(), c)
+    return ptr_to_name
+
+
+def fct_get_pack(storage, ptr_to_name, sanity_check=False):
+    # ptr_to_name: see get_ptr_to_name, built once per op execution
     def pack(x):
-        for i, c in enumerate(no_save_list):
-            if storage.ld[c].data_ptr() == x.data_ptr():
-                if sanity_check:
-                    assert torch.equal(
-                        storage.ld[c].data.as_strided_(
-                            x.shape, x.stride(), x.storage_offset()
-                        ),
-                        x,
-                    )
-                return (
-                    c,
-                    x.shape,
-                    x.stride(),
-                    x.storage_offset(),
-                    # x.clone(),
-                )
-        return x
+        c = ptr_to_name.get(x.data_ptr())
+        if c is None:
+            storage.pack_counts["saved"] += 1
+            return x
+        if sanity_check:
+            assert torch.equal(
+                storage.ld[c].data.as_strided_(
+                    x.shape, x.stride(), x.storage_offset()
+                ),
+                x,
+            )
+        storage.pack_counts["by_ref"] += 1
+        return (
+            c,
+            x.shape,
+            x.stride(),
+            x.storage_offset(),
+            # x.clone(),
+        )
 
     return pack
 
@@ -75,13 +90,22 @@ def fct_run_forward_no_grad(storage, code):
 def fct_run_forward_with_grad(storage, code, no_save_list=[]):
     def fct():
         with torch.autograd.graph.saved_tensors_hooks(
-            fct_get_pack(storage, no_save_list), fct_get_unpack(storage)
+            fct_get_pack(storage, get_ptr_to_name(storage, no_save_list)),
+            fct_get_unpack(storage),
         ):
             exec(code, storage.gd, storage.ld)
 
     return fct
 
 
+def fct_run_segment(storage, code):
+    # -> code of Compiler.get_segment, which enters the hooks itself
+    def fct():
+        exec(code, storage.gd, storage.ld)
+
+    return fct
+
+
 def fct_run_inplace(storage, tensor_name, inplace_code):
     def fct():
         # ld = {tensor_name: storage.ld[f"_{tensor_name}"]}
@@ -215,6 +239,9 @@ class RK_Storage:
         self.shapes = dict()
         self.dtypes = dict()
         self.rng_state = RngState()
+        # -> tensors saved for the backward by the pack hook: kept as a
+        # -> reference to a tensor of ld ("by_ref") or saved as they are
+        self.pack_counts = {"by_ref": 0, "saved": 0}
 
     def add_val(self, val, x):
         self.ld[val] = x
@@ -233,19 +260,73 @@ class Compiler:
     """
     The compiler takes the full operation schedule as input,
     return the lists of Python functions.
-    Each list corresponds to one operation.
+    Each list corresponds to one operation, or to one segment of
+    operations compiled together (see compile).
     """
 
     def __init__(self, storage):
         self.storage = storage
         self.shapes = storage.shapes
         self.device = self.storage.gd["device"]
+        # -> code string -> code object, see compile_code
+        self.code_cache = {}
+        self.compile_times = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        # saved_time: time exec would spend each step compiling the
+        # strings, which is now spent once in compile_code
+        self.stats = {"nb_code": 0, "nb_skipped": 0, "saved_time": 0}
+
+    def compile_code(self, code):
+        """
+        Returns the code object of code, compiled once for every step
+        (exec compiles a string each time it is called), or None if
+        code does nothing, in which case it shouldn't be executed.
+        """
+        if not code.strip():
+            self.stats["nb_skipped"] += 1
+            return None
+        if code not in self.code_cache:
+            start = time.perf_counter()
+            self.code_cache[code] = compile(code, "<rockmate>", "exec")
+            self.compile_times[code] = time.perf_counter() - start
+        self.stats["nb_code"] += 1
+        self.stats["saved_time"] += self.compile_times[code]
+        return self.code_cache[code]
+
+    def _index_op_sched(self):
+        """
+        Positions of the names in op_sched, so that the queries of
+        get_fwd/get_bwd don't scan op_name_list (compile would be
+        quadratic in the length of op_sched).
+        """
+        self.positions = {}
+        for i, name in enumerate(self.op_sched.op_name_list):
+            self.positions.setdefault(name, []).append(i)
+        # -> previous/next occurrence of the name of the i-th op, or None
+        self.prev_idx = [None] * len(self.op_sched.op_name_list)
+        self.next_idx = [None] * len(self.op_sched.op_name_list)
+        for pos in self.positions.values():
+            for a, b in zip(pos[:-1], pos[1:]):
+                self.next_idx[a] = b
+                self.prev_idx[b] = a
+        # -> first index, as kdn_names.index
+        self.kdn_idx = {}
+        for j, kdn_name in enumerate(self.op_sched.kdn_names):
+            self.kdn_idx.setdefault(kdn_name, j)
+
+    def _find(self, name, start, end=None):
+        # -> first index of name in op_name_list[start:end], or None
+        pos = self.positions.get(name, [])
+        j = bisect.bisect_left(pos, start)
+        if j < len(pos) and (end is None or pos[j] < end):
+            return pos[j]
+        return None
 
     def _is_alive(self, kdn_name, i):
-        if kdn_name in self.op_sched.kdn_names:
-            return self.op_sched.alive_list[i][
-                self.op_sched.kdn_names.index(kdn_name)
-            ]
+        if kdn_name in self.kdn_idx:
+            return self.op_sched.alive_list[i][self.kdn_idx[kdn_name]]
 
         else:
             return True
@@ -255,24 +336,25 @@ class Compiler:
 
     def get_fwd(self, op, i):
         if "loss" in op.main_target:
-            return [fct_run_forward_no_grad(self.storage, "")]
-        rec = op.name in self.op_sched.op_name_list[:i]
+            return []
+        rec = self.prev_idx[i] is not None
         if not op.proxy:
             last_before_bwd = False
         else:
-            next_bwd_idx = i + self.op_sched.op_name_list[i:].index(
-                op.name.replace("fwd", "bwd")
-            )
+            next_bwd_idx = self._find(op.name.replace("fwd", "bwd"), i)
+            if next_bwd_idx is None:
+                raise ValueError(f"No bwd after {op.name} in the schedule")
             last_before_bwd = not (
-                op.name in self.op_sched.op_name_list[i + 1 : next_bwd_idx]
+                self.next_idx[i] is not None
+                and self.next_idx[i] < next_bwd_idx
             )
         l = []
 
         if op.is_rand:
             if not rec:
-                l.append(fct_get_rng_state(self.storage, op.name))
+                l.append((fct_get_rng_state, op.name))
             else:
-                l.append(fct_restore_rng_state(self.storage, op.name))
+                l.append((fct_restore_rng_state, op.name))
 
         # compile inplace code
         inplace_code = make_str_list_assign(
@@ -307,58 +389,44 @@ class Compiler:
 
             for target in op.tensor_targets:
                 inplace_code = inplace_code.replace(target, "_" + target)
-            l.append(
-                fct_run_forward_no_grad(
-                    self.storage, main_code.replace("self", "original_mod"),
-                )
-            )
+            main_code = main_code.replace("self", "original_mod")
+            l.append((fct_run_forward_no_grad, main_code))
         else:
             no_save_list = []
             candidates = list(op.deps_global) + list(op.users_global)
             for kdn_name in candidates:
-                if kdn_name in self.op_sched.op_name_list[i:next_bwd_idx]:
+                if self._find(kdn_name, i, next_bwd_idx) is not None:
                     no_save_list.append(kdn_name.split(" ")[0])
 
             for target in op.tensor_targets:
                 inplace_code = inplace_code.replace(target, "_" + target)
 
-            l.append(
-                fct_run_forward_with_grad(
-                    self.storage,
-                    main_code.replace("self", "original_mod"),
-                    no_save_list=no_save_list,
-                )
-            )
-        l.append(
-            fct_run_forward_with_grad(
-                self.storage, inplace_code.replace("self", "original_mod"),
-            )
-        )
-        l.append(fct_run_detach(self.storage, op.main_target))
-        l.append(
-            fct_run_forward_with_grad(
-                self.storage, body_code.replace("self", "original_mod")
-            )
-        )
+            main_code = main_code.replace("self", "original_mod")
+            l.append((fct_run_forward_with_grad, main_code, no_save_list))
+        inplace_code = inplace_code.replace("self", "original_mod")
+        l.append((fct_run_forward_with_grad, inplace_code, []))
+        l.append((fct_run_detach, op.main_target))
+        body_code = body_code.replace("self", "original_mod")
+        l.append((fct_run_forward_with_grad, body_code, []))
 
         # get the shape of tensors
         if not rec:
-            l.append(fct_get_shapes(self.storage, f"_{op.main_target}"))
+            l.append((fct_get_shapes, f"_{op.main_target}"))
             for target in op.tensor_targets:
-                l.append(fct_get_shapes(self.storage, target))
+                l.append((fct_get_shapes, target))
         return l
 
     def get_bwd(self, op, i):
-        rec = op.name in self.op_sched.op_name_list[:i]
-        last = not (op.name in self.op_sched.op_name_list[i + 1 :])
+        rec = self.prev_idx[i] is not None
+        last = self.next_idx[i] is None
         l = []
         l2 = []
 
         if op.is_rand:
             if not rec:
-                l.append(fct_get_rng_state(self.storage, op.name))
+                l.append((fct_get_rng_state, op.name))
             else:
-                l.append(fct_restore_rng_state(self.storage, op.name))
+                l.append((fct_restore_rng_state, op.name))
 
         temporary_tensor_names = [
             kdn_name.split(" ")[0]
@@ -368,64 +436,186 @@ class Compiler:
         if op.main_target in temporary_tensor_names:
             temporary_tensor_names.append(f"_{op.main_target}")
         for tensor_name in temporary_tensor_names:
-            l.append(fct_generate_fake_data(self.storage, tensor_name))
-            l2.append(fct_del_tensor_data(self.storage, tensor_name))
+            l.append((fct_generate_fake_data, tensor_name))
+            l2.append((fct_del_tensor_data, tensor_name))
         if rec:
-            prev_i = i - self.op_sched.op_name_list[:i][::-1].index(op.name) - 1
+            prev_i = self.prev_idx[i]
             input_names = []
             for kdn_name in op.users_global:
-                if f"del {kdn_name}" in self.op_sched.op_name_list[prev_i:i]:
+                if self._find(f"del {kdn_name}", prev_i, i) is not None:
                     input_names.append(kdn_name.split(" ")[0])
             l.append(
-                fct_run_backward_with_inputs(
-                    self.storage,
+                (
+                    fct_run_backward_with_inputs,
                     op.main_target,
-                    retain_graph=(not last),
-                    input_names=input_names,
+                    not last,
+                    input_names,
                 )
             )
         else:
-            l.append(
-                fct_run_backward(
-                    self.storage, op.main_target, retain_graph=(not last)
-                )
-            )
+            l.append((fct_run_backward, op.main_target, not last))
 
         return l + l2
 
     def get_del_data(self, op, i):
         l = []
-        l.append(fct_del_tensor_data(self.storage, op.main_target))
+        l.append((fct_del_tensor_data, op.main_target))
         if op.info is not None and op.info.requires_grad:
-            l.append(fct_del_tensor_data(self.storage, f"_{op.main_target}"))
+            l.append((fct_del_tensor_data, f"_{op.main_target}"))
         if op.includes_base:
-            l.append(fct_del_tensor_base(self.storage, op.main_target))
+            l.append((fct_del_tensor_base, op.main_target))
         for v in op.tensor_targets:
-            l.append(fct_del_tensor_data(self.storage, v))
+            l.append((fct_del_tensor_data, v))
         for v in op.container_targets:
-            l.append(fct_del_var(self.storage, v))
-        # l.append(fct_del_var(self.storage, f"_{op.main_target}"))
+            l.append((fct_del_var, v))
+        # l.append((fct_del_var, f"_{op.main_target}"))
 
         return l
 
     def get_del_grad(self, op, i):
-        return [fct_del_tensor_grad(self.storage, op.main_target)]
-
-    def compile(self, op_sched):
+        return [(fct_del_tensor_grad, op.main_target)]
+
+    def get_fct(self, instr):
+        # -> the closure of an instruction (fct, *args) of get_fwd, ...
+        fct, *args = instr
+        if fct in [fct_run_forward_no_grad, fct_run_forward_with_grad]:
+            args[0] = self.compile_code(args[0])
+            if args[0] is None:
+                return None
+        return fct(self.storage, *args)
+
+    def get_src(self, instr):
+        """
+        Python statements doing what the closure of instr does,
+        executed with storage.gd and storage.ld, inside the
+        saved_tensors_hooks of get_segment.
+        """
+        fct, *args = instr
+        if fct in [fct_run_forward_no_grad, fct_run_forward_with_grad]:
+            code = args[0]
+            if not code.strip():
+                return ""
+            if fct is fct_run_forward_no_grad:
+                return "with torch.no_grad():\n" + textwrap.indent(
+                    code, "    "
+                )
+            if not args[1]:
+                return code
+            # -> __rk_no_save is the ptr_to_name of the pack hook, emptied
+            # -> even if the op raises, for the next ones of the segment
+            return (
+                f"__rk_no_save.update(get_ptr_to_name(__rk_storage, "
+                f"{args[1]!r}))\ntry:\n{textwrap.indent(code, '    ')}\n"
+                "finally:\n    __rk_no_save.clear()"
+            )
+        name = args[0]
+        st = "__rk_storage"
+        if fct is fct_get_shapes:
+            return (
+                f"{st}.shapes[{name!r}] = {name}.shape\n"
+                f"{st}.dtypes[{name!r}] = {name}.dtype"
+            )
+        if fct is fct_get_rng_state:
+            return f"{st}.rng_state.get({name!r})"
+        if fct is fct_restore_rng_state:
+            return f"{st}.rng_state.restore({name!r})"
+        if fct is fct_run_detach:
+            return f"{name}.data = _{name}.data"
+        if fct is fct_run_backward:
+            return f"_{name}.backward({name}.grad, retain_graph={args[1]})"
+        if fct is fct_run_backward_with_inputs:
+            inputs = ", ".join(args[2])
+            return (
+                f"_{name}.backward({name}.grad, inputs=[{inputs}], "
+                f"retain_graph={args[1]})"
+            )
+        if fct is fct_generate_fake_data:
+            return (
+                f"{name}.data = (cmeta if {st}.dtypes[{name!r}].is_complex "
+                f"else meta).expand(np.prod({st}.shapes[{name!r}]))"
+                f".view({st}.shapes[{name!r}])"
+            )
+        if fct is fct_del_tensor_data:
+            return f"{name}.data = torch.empty(0, device=device)"
+        if fct is fct_del_tensor_base:
+            return f"_{name}._base.data = torch.empty(0, device=device)"
+        if fct is fct_del_tensor_grad:
+            return f"{name}.grad = None"
+        if fct is fct_del_var:
+            return f"{name} = None"
+        raise Exception(f"No source for {fct.__name__}")
+
+    def get_segment(self, instr_lists):
+        """
+        A single closure for the operations of instr_lists: their
+        statements are inlined in one code object, which enters the
+        saved_tensors_hooks once, instead of one closure per statement.
+        """
+        src = "\n".join(
+            src
+            for l in instr_lists
+            for src in map(self.get_src, l)
+            if src
+        )
+        if not src:
+            return []
+        src = (
+            "with torch.autograd.graph.saved_tensors_hooks("
+            "__rk_pack, __rk_unpack):\n" + textwrap.indent(src, "    ") + "\n"
+        )
+        return [fct_run_segment(self.storage, self.compile_code(src))]
+
+    def compile(self, op_sched, segments=None):
+        """
+        Returns one list of closures per operation of op_sched or, if
+        segments (numbers of consecutive operations, e.g. of each
+        SeqBlock) is given, one list per segment with a single closure.
+        """
         self.op_sched = op_sched
+        self._index_op_sched()
+        # -> stats of this schedule only, as the code cache is kept
+        # -> between calls (e.g. per op and fused, in Rockmate)
+        self.reset_stats()
 
-        fct_list = []
+        instr_list = []
         for i, op in enumerate(op_sched.op_list):
             if "fwd" in op.name:
-                fct_list.append(self.get_fwd(op, i))
+                instr_list.append(self.get_fwd(op, i))
             elif "bwd" in op.name:
-                fct_list.append(self.get_bwd(op, i))
+                instr_list.append(self.get_bwd(op, i))
             elif "data" in op.name:
-                fct_list.append(self.get_del_data(op, i))
+                instr_list.append(self.get_del_data(op, i))
             elif "grad" in op.name:
-                fct_list.append(self.get_del_grad(op, i))
+                instr_list.append(self.get_del_grad(op, i))
             else:
-                fct_list.append([])
+                instr_list.append([])
 
-        return fct_list
+        if segments is None:
+            fct_list = [
+                [fct for fct in map(self.get_fct, l) if fct is not None]
+                for l in instr_list
+            ]
+        else:
+            assert sum(segments) == len(instr_list)
+            ptr_to_name = {}
+            self.storage.gd["__rk_storage"] = self.storage
+            self.storage.gd["__rk_no_save"] = ptr_to_name
+            self.storage.gd["__rk_pack"] = fct_get_pack(
+                self.storage, ptr_to_name
+            )
+            self.storage.gd["__rk_unpack"] = fct_get_unpack(self.storage)
+            fct_list = []
+            start = 0
+            for nb in segments:
+                fct_list.append(
+                    self.get_segment(instr_list[start : start + nb])
+                )
+                start += nb
 
+        print_debug(
+            f"Compiler: {self.stats['nb_code']} code objects "
+            f"({len(self.code_cache)} distinct), {self.stats['nb_skipped']} "
+            f"empty codes skipped, {self.stats['saved_time'] * 1000:.2f}ms "
+            f"of compilation saved per step"
+        )
+        return fct_list
@@ -4,62 +4,209 @@
 #  based on rotor/algorithms/parameters.py
 # ==========================
 from rkgb.utils import imports_from_rotor as irotor
-from rockmate.ILP_gurobi_solver import ModelGurobi
+from rkgb.utils import print_debug
 import numpy as np
 from rockmate.def_op import RunOp, DelOp, OpSchedule
+from rockmate.solution_cache import encode_sched, decode_sched
+from rockmate.heuristic_solver import ModelHeuristic
+from rockmate.presolve import Coarse_K_graph, Presolved_Model
 import math
-from moccasin.cp import Moccasin
+import time
+import importlib.util
+import multiprocessing
+from collections import Counter
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor
+
+# -> set by RK_Chain, see get_time_limit and get_rk_model
+ilp_limits = {
+    "time_limit": None,
+    "mip_gap": None,
+    "deadline": None,
+    "merge_threshold": None,
+    # -> limit of the solves looking for the first solution of a
+    # -> block once the deadline is passed, so they can't run forever
+    "first_solution_time_limit": 60,
+}
+# -> backends raced by solver="portfolio" (if empty, the installed
+# -> ones, see get_portfolio_solvers), and how many races each won
+portfolio_solvers = []
+portfolio_wins = Counter()
+
+
+def set_method(solver):
+    # solver: the name of a backend, "portfolio", or a list of
+    # -> backends to race (see race_rk_solutions)
+    global method
+    if isinstance(solver, (list, tuple)):
+        portfolio_solvers[:] = solver
+        solver = "portfolio"
+    method = solver
+
+
+def get_method():
+    # -> what set_method needs to restore it in another process
+    return get_portfolio_solvers() if method == "portfolio" else method
+
+
+def get_portfolio_solvers():
+    if portfolio_solvers:
+        return list(portfolio_solvers)
+    # -> Gurobi may still lack a license: its worker then crashes and
+    # -> is ignored by race_rk_solutions
+    installed = lambda name: importlib.util.find_spec(name) is not None
+    solvers = []
+    if installed("gurobipy"):
+        solvers.append("MIP")
+    if installed("moccasin"):
+        solvers.append("CP")
+    solvers.append("HiGHS")  # -> scipy
+    if installed("mip"):
+        solvers.append("python-mip")
+    return solvers
 
 # ==========================
 # ======== RK Block ========
 # ==========================
 
 
-def get_rk_solution(list_kg, l_bd_abar, budget_all):
+def get_rk_model(kg, budget_all, save_budget):
+    # -> backends are imported only when used, so that none of them
+    # -> is needed to import rockmate (see ModelHeuristic)
+    ckg = None
+    if ilp_limits["merge_threshold"] and method != "CP":
+        # -> presolve: the model is built on a coarser K_graph
+        ckg = Coarse_K_graph(kg, ilp_limits["merge_threshold"])
+        print_debug(
+            f"presolve: {len(kg.list_kcn)} -> {len(ckg.list_kcn)} K_C_nodes, "
+            f"{ckg.nb_vars[0]} -> {ckg.nb_vars[1]} ILP variables"
+        )
+        kg = ckg
 
     if method == "CP":
+        from moccasin.cp import Moccasin
+
         md = Moccasin.from_kG(
-            list_kg[0],
+            kg,
             name=None,
             B=budget_all,
             objective="min_runtime")
 
     elif method == "MIP": ##only support for Gurobi solver for now
+        from rockmate.ILP_gurobi_solver import ModelGurobi
+
         param_dict = {
             "LogToConsole": 0,
             "IntegralityFocus": 1,
         }
         md = ModelGurobi(
-            list_kg[0],
+            kg,
             budget_all,
-            max(l_bd_abar),
+            save_budget,
             gcd=10000,
             gurobi_params=param_dict,
         )
 
+    elif method == "HiGHS":  # no license needed, bundled with scipy
+        from rockmate.ILP_HiGHS import ModelHiGHS
+
+        md = ModelHiGHS(
+            kg,
+            budget_all,
+            save_budget,
+            gcd=10000,
+            highs_params={"disp": False},
+        )
+
+    elif method == "heuristic":  # greedy, no solver needed
+        md = ModelHeuristic(kg, budget_all, save_budget)
+
     else:
-        md = ModelMIP(list_kg[0], budget_all, max(l_bd_abar), gcd=10000,)
+        from rockmate.ILP_MIP import ModelMIP
+
+        md = ModelMIP(kg, budget_all, save_budget, gcd=10000,)
         md.md.verbose = 0
+    if ckg is not None:
+        md = Presolved_Model(md, ckg)
+    return md
+
+
+def get_time_limit():
+    """
+    Time limit of the next solve: the per-solve limit, cut to what
+    remains of the global planning budget (None if there is no limit).
+    """
+    time_limit = ilp_limits["time_limit"]
+    if ilp_limits["deadline"] is not None:
+        remaining = max(ilp_limits["deadline"] - time.time(), 0)
+        time_limit = (
+            remaining if time_limit is None else min(time_limit, remaining)
+        )
+    return time_limit
+
+
+def get_rk_solution(list_kg, l_bd_abar, budget_all, md=None, found=False):
+    # md: a model built by get_rk_model, re-solved with budget_all
+    # -> (the CP model of Moccasin has to be rebuilt)
+    # found: whether a solution of this block was already found
+    # returns the solutions of each l_bd_abar, and whether they are
+    # -> complete: False if a solve was skipped or stopped at its limit
+    if md is None or method == "CP":
+        md = get_rk_model(list_kg[0], budget_all, max(l_bd_abar))
+    else:
+        md.set_budget(budget_all)
     list_list_sols = []
+    complete = True
     for bd_abar in np.sort(l_bd_abar)[::-1]:
+        time_limit = get_time_limit()
+        if time_limit == 0:
+            # -> the global budget is spent: we only look for
+            # -> a first solution, as each block needs one
+            if found:
+                list_list_sols.append(False)
+                complete = False
+                continue
+            time_limit = ilp_limits["time_limit"]
+            if time_limit is None:
+                time_limit = ilp_limits["first_solution_time_limit"]
         md.add_abar_constraint(bd_abar)
-        md.solve()
+        if method == "CP":
+            md.solve()
+        else:
+            md.solve(time_limit, ilp_limits["mip_gap"])
+            solve_time = getattr(md, "solve_time", None)
+            if time_limit is not None and solve_time is not None:
+                # -> it may have been stopped by the time limit
+                complete = complete and solve_time < time_limit
 
         if not md.feasible:
             list_list_sols.append(False)
             continue
             # return False
+        found = True
         list_sols = []
         for kg in list_kg:
             fwd_sched, bwd_sched = md.schedule(kg)
-            list_sols.append(RK_Block_Solution(fwd_sched, bwd_sched))
+            list_sols.append(
+                RK_Block_Solution(
+                    fwd_sched,
+                    bwd_sched,
+                    getattr(md, "solve_time", None),
+                    getattr(md, "gap", None),
+                )
+            )
         list_list_sols.append(list_sols)
-    return list_list_sols
+    return list_list_sols, complete
 
 
 class RK_Block_Solution:
-    def __init__(self, fwd_sched, bwd_sched):
+    def __init__(self, fwd_sched, bwd_sched, solve_time=None, gap=None):
         self.fwd_sched, self.bwd_sched = fwd_sched, bwd_sched
+        # -> time spent by the solver to find this solution
+        self.solve_time = solve_time
+        # -> relative MIP gap reported by the solver, 0 if proven optimal;
+        # -> None if unknown: CP and the heuristic don't report any
+        self.gap = gap
         self.time_fwd = self.fwd_sched.time
         self.time_bwd = self.bwd_sched.time
         self.size_a_bar = self.fwd_sched.save[-1]
@@ -69,24 +216,212 @@ class RK_Block_Solution:
         )
 
 
-def get_rk_block(list_kg, nb_bdg_abar, nb_bdg_all):
-    list_blocks = []
-    for kg in list_kg:
-        list_blocks.append(RK_Block(kg))
-    kdn_sizes = [kdn.mem for kdn in kg.list_kdn]
-    overheads = [kcn.overhead for kcn in kg.list_kcn]
-    max_bdg = sum(kdn_sizes) + max(overheads)
-    min_bdg = (
-        list_blocks[-1].Fc_sched.overhead + list_blocks[-1].Fc_sched.save[-1]
+def get_rk_solutions(list_kg, l_l_bd_abar, l_bd_all, report=None):
+    """
+    Solves the block for each budget of l_bd_all, building the model
+    only once and changing its budgets in place between solves.
+    report(i, list_sols) is called once the i-th budget is solved.
+    Also returns whether all the solves are complete, see get_rk_solution.
+    """
+    md = None
+    l_list_sols = []
+    complete = True
+    for i, (l_bd_abar, bd_all) in enumerate(zip(l_l_bd_abar, l_bd_all)):
+        if md is None:
+            md = get_rk_model(list_kg[0], bd_all, max(l_bd_abar))
+        found = any(sol for list_sols in l_list_sols for sol in list_sols)
+        list_sols, complete_i = get_rk_solution(
+            list_kg, l_bd_abar, bd_all, md, found
+        )
+        l_list_sols.append(list_sols)
+        complete = complete and complete_i
+        if report is not None:
+            report(i, list_sols)
+    return l_list_sols, complete
+
+
+def is_proven(l_list_sols, limits):
+    """
+    Whether the backend proved its solutions optimal: each one within
+    the gap target, as reported by the solver (CP and the heuristic
+    report no gap, so they never are), and no budget left without
+    solution when a time limit may have cut the solve.
+    """
+    tol = limits["mip_gap"] if limits["mip_gap"] else 1e-4
+    sols = [sol for list_sols in l_list_sols for sol in list_sols]
+    no_limit = limits["time_limit"] is None and limits["deadline"] is None
+    return (
+        any(sols)
+        and all(
+            sol[0].gap is not None and sol[0].gap <= tol for sol in sols if sol
+        )
+        and (no_limit or all(sols))
     )
+
+
+def race_rk_solutions_worker(queue, solver, list_kg, l_l_bd_abar,
+                             l_bd_all, limits):
+    set_method(solver)
+    ilp_limits.update(limits)
+    # -> each budget is sent once solved, so that it can be used even
+    # -> if the worker is killed before the end of the grid
+    l_list_sols, complete = get_rk_solutions(
+        list_kg,
+        l_l_bd_abar,
+        l_bd_all,
+        report=lambda i, list_sols: queue.put((solver, i, list_sols)),
+    )
+    queue.put((solver, None, (is_proven(l_list_sols, limits), complete)))
+
+
+def race_rk_solutions(list_kg, l_l_bd_abar, l_bd_all):
+    """
+    Runs get_rk_solutions on the whole budget grid of the block with each
+    backend of get_portfolio_solvers in its own process, which keeps its
+    model between the solves. Keeps the first proven optimal result;
+    otherwise, once all are done, or out of time with a solution, the
+    best one (most feasible budgets, then lowest time), including the
+    budgets solved by unfinished backends. Others are killed.
+    Also returns whether the result is complete: the winner finished
+    its grid, and none of its solves was skipped or stopped at a limit.
+    """
+    solvers = get_portfolio_solvers()
+    queue = multiprocessing.Queue()
+    procs = {
+        solver: multiprocessing.Process(
+            target=race_rk_solutions_worker,
+            args=(queue, solver, list_kg, l_l_bd_abar, l_bd_all,
+                  dict(ilp_limits)),
+        )
+        for solver in solvers
+    }
+    for proc in procs.values():
+        proc.start()
+    # -> a backend is out of time after the time limit of all its
+    # -> solves, which also bounds CP, whose solve takes no limit
+    end_time = ilp_limits["deadline"]
+    if ilp_limits["time_limit"] is not None:
+        nb_solves = sum(len(l_bd_abar) for l_bd_abar in l_l_bd_abar)
+        solves_end = time.time() + ilp_limits["time_limit"] * nb_solves
+        end_time = solves_end if end_time is None else min(end_time, solves_end)
+    results = {solver: [None] * len(l_bd_all) for solver in solvers}
+    has_sol = lambda l_list_sols: any(
+        sol for list_sols in l_list_sols if list_sols for sol in list_sols
+    )
+    finished = {}
+    winner = None
+    while len(finished) < len(procs):
+        try:
+            solver, i, value = queue.get(timeout=1)
+        except Empty:
+            if queue.empty() and not any(
+                proc.is_alive() for proc in procs.values()
+            ):
+                # -> the others crashed (e.g. no license)
+                break
+            if (
+                end_time is not None
+                and time.time() > end_time
+                and any(has_sol(l) for l in results.values())
+            ):
+                break
+            continue
+        if i is not None:
+            results[solver][i] = value
+            continue
+        proven, finished[solver] = value
+        if proven:
+            winner = solver
+            break
+    for proc in procs.values():
+        if proc.is_alive():
+            proc.terminate()
+        proc.join()
+    if winner is None:
+        candidates = [
+            solver
+            for solver in solvers
+            if solver in finished or has_sol(results[solver])
+        ]
+        if not candidates:
+            raise RuntimeError("No backend of the portfolio found a result")
+        score = lambda l_list_sols: (
+            sum(1 for l in l_list_sols if l for sol in l if sol),
+            -sum(
+                sol[0].time_fwd + sol[0].time_bwd
+                for l in l_list_sols
+                if l
+                for sol in l
+                if sol
+            ),
+        )
+        winner = max(candidates, key=lambda solver: score(results[solver]))
+    portfolio_wins[winner] += 1
+    print_debug(
+        f"portfolio: {winner} won ({len(finished)} of {len(procs)} "
+        f"backends finished)"
+    )
+    # -> budgets not reached by the winner have no solution
+    l_list_sols = [
+        list_sols if list_sols is not None else [False] * len(l_bd_abar)
+        for list_sols, l_bd_abar in zip(results[winner], l_l_bd_abar)
+    ]
+    return l_list_sols, finished.get(winner, False)
+
+
+def get_rk_solutions_in_worker(
+    list_kg, l_l_bd_abar, l_bd_all, solver, limits
+):
+    set_method(solver)
+    ilp_limits.update(limits)
+    return get_rk_solutions(list_kg, l_l_bd_abar, l_bd_all)
+
+
+def solve_rk_block(list_kg, min_bdg, max_bdg, nb_bdg_abar, nb_bdg_all,
+                   n_workers=None):
+    """
+    Solves the ILPs of the block on its budget grid, and returns the
+    non-dominated solutions (one RK_Block_Solution per K_graph each),
+    the number of dominated ones, and whether the solves are complete
+    (see get_rk_solution), so that they give the same result again.
+    """
+    kg = list_kg[-1]
     l_bd_all = np.linspace(min_bdg, max_bdg, nb_bdg_all)
+    l_l_bd_abar = [
+        np.linspace(kg.output_kdn_data.mem, bd_all, nb_bdg_abar)
+        for bd_all in l_bd_all
+    ]
+    if method == "portfolio":
+        # -> one race for the whole grid, already one process per backend
+        l_list_sols, complete = race_rk_solutions(
+            list_kg, l_l_bd_abar, l_bd_all
+        )
+    elif n_workers and n_workers > 1 and len(l_bd_all) > 1:
+        # -> l_bd_all is split in contiguous chunks, each solved by a
+        # -> worker with its own model; results are merged in the order
+        # -> of l_bd_all, as in the serial loop
+        nb = min(n_workers, len(l_bd_all))
+        chunks = np.array_split(np.arange(len(l_bd_all)), nb)
+        with ProcessPoolExecutor(nb) as pool:
+            results = list(
+                pool.map(
+                    get_rk_solutions_in_worker,
+                    [list_kg] * nb,
+                    [[l_l_bd_abar[i] for i in chunk] for chunk in chunks],
+                    [l_bd_all[chunk] for chunk in chunks],
+                    [get_method()] * nb,
+                    [ilp_limits] * nb,
+                )
+            )
+        l_list_sols = [sols for l, _ in results for sols in l]
+        complete = all(complete for _, complete in results)
+    else:
+        l_list_sols, complete = get_rk_solutions(
+            list_kg, l_l_bd_abar, l_bd_all
+        )
     sols = []
     uniq_sols = set()
-    for bd_all in l_bd_all:
-        l_bd_abar = np.linspace(kg.output_kdn_data.mem, bd_all, nb_bdg_abar)
-        # for bd_abar in l_bd_abar:
-        #     if bd_all >= bd_abar:
-        list_sols = get_rk_solution(list_kg, l_bd_abar, bd_all)
+    for list_sols in l_list_sols:
         for sol in list_sols:
             if sol:
                 t = (
@@ -97,17 +432,132 @@ def get_rk_block(list_kg, nb_bdg_abar, nb_bdg_all):
                 if not (t in uniq_sols):
                     uniq_sols.add(t)
                     sols.append(sol)
-                    for s, block in zip(sol, list_blocks):
-                        block.sols.append(s)
+    pareto_sols = get_pareto_sols(sols)
+    return pareto_sols, len(sols) - len(pareto_sols), complete
+
+
+def get_rk_block(list_kg, nb_bdg_abar, nb_bdg_all, n_workers=None,
+                 cache=None, ano_sg=None):
+    # cache: a RK_Solution_Cache, used if ano_sg, the anonymized
+    # -> S_graph of the block, is given to identify it
+    list_blocks = []
+    for kg in list_kg:
+        list_blocks.append(RK_Block(kg))
+    kdn_sizes = [kdn.mem for kdn in kg.list_kdn]
+    overheads = [kcn.overhead for kcn in kg.list_kcn]
+    max_bdg = sum(kdn_sizes) + max(overheads)
+    min_bdg = (
+        list_blocks[-1].Fc_sched.overhead + list_blocks[-1].Fc_sched.save[-1]
+    )
+    key = cached = None
+    if cache is not None:
+        key = cache.block_key(
+            ano_sg,
+            kg,
+            nb_bdg_abar,
+            nb_bdg_all,
+            (
+                get_method(),
+                ilp_limits["time_limit"],
+                ilp_limits["mip_gap"],
+                ilp_limits["merge_threshold"],
+            ),
+        )
+        cached = cache.get(key)
+    if cached is not None:
+        # -> stored by index, rebuilt for each K_graph of the class
+        pareto_sols = [
+            [
+                RK_Block_Solution(
+                    decode_sched(fwd, kg_),
+                    decode_sched(bwd, kg_),
+                    solve_time,
+                    gap,
+                )
+                for kg_ in list_kg
+            ]
+            for fwd, bwd, solve_time, gap in cached["sols"]
+        ]
+        nb_dominated = cached["nb_dominated"]
+        print_debug(f"{list_blocks[0].block_name}: solutions found in cache")
+    else:
+        pareto_sols, nb_dominated, complete = solve_rk_block(
+            list_kg, min_bdg, max_bdg, nb_bdg_abar, nb_bdg_all, n_workers
+        )
+        # -> a run with more time could find other solutions
+        if key is not None and complete:
+            cache.put(
+                key,
+                {
+                    "sols": [
+                        (
+                            encode_sched(sol[-1].fwd_sched, kg),
+                            encode_sched(sol[-1].bwd_sched, kg),
+                            sol[-1].solve_time,
+                            sol[-1].gap,
+                        )
+                        for sol in pareto_sols
+                    ],
+                    "nb_dominated": nb_dominated,
+                },
+            )
+    for block in list_blocks:
+        block.nb_sol_dominated = nb_dominated
+    print_debug(
+        f"{list_blocks[0].block_name}: {len(pareto_sols)} solutions kept, "
+        f"{nb_dominated} dominated ones removed"
+    )
+    for sol in pareto_sols:
+        for s, block in zip(sol, list_blocks):
+            block.sols.append(s)
     return list_blocks
 
 
+def get_rk_block_in_worker(
+    list_kg, nb_bdg_abar, nb_bdg_all, solver, limits, n_workers=None,
+    cache=None, ano_sg=None,
+):
+    # -> in a spawned process, the globals aren't set by RK_Chain
+    set_method(solver)
+    ilp_limits.update(limits)
+    return get_rk_block(
+        list_kg, nb_bdg_abar, nb_bdg_all, n_workers, cache, ano_sg
+    )
+
+
+def get_pareto_sols(sols):
+    """
+    Removes the solutions dominated by another one, i.e. worse or equal
+    in time and in every memory cost used by the rotor DP, and strictly
+    worse in at least one. Keeps the order of the remaining ones.
+    """
+    if not sols:
+        return sols
+    costs = np.array(
+        [
+            (
+                sol[0].time_fwd + sol[0].time_bwd,
+                sol[0].size_a_bar,
+                sol[0].overhead_fwd,
+                sol[0].overhead_bwd,
+            )
+            for sol in sols
+        ]
+    )
+    # no_worse[j, i] : sols[j] is no worse than sols[i] in every cost
+    no_worse = (costs[:, None, :] <= costs[None, :, :]).all(axis=2)
+    better = (costs[:, None, :] < costs[None, :, :]).any(axis=2)
+    dominated = (no_worse & better).any(axis=0)
+    return [sol for sol, d in zip(sols, dominated) if not d]
+
+
 class RK_Block:
     def __init__(self, kg):
         self.block_name = (
             f"Block[{kg.input_kdn_data.name}->{kg.output_kdn_data.name}]"
         )
         self.sols = []
+        self.nb_sol_dominated = 0
         # == build Fc/Fn schedule
         def _fast_fwd_sched():
             def _can_del(i, kdn):
@@ -193,18 +643,73 @@ class RK_Chain:
         nb_budget_abar=10,
         nb_budget_all=3,
         mem_unit=None,
-        solver="MIP"
+        solver="MIP",  # "CP", "HiGHS", "python-mip", "heuristic", "portfolio" or a list
+        n_workers=None,
+        cache=None,
+        list_ano_S=None,
+        time_limit=None,
+        solve_time_limit=None,
+        mip_gap=None,
+        merge_threshold=None,
     ):
-        global method
-        method = solver
+        # mem_unit: in bytes, or "auto" to pick it from the memory sizes
+        # n_workers: if > 1, equivalence classes are solved in parallel,
+        # and the remaining workers share the budget grid of each class
+        # cache: a RK_Solution_Cache, where the solutions of each class
+        # are looked up by the anonymized S_graph in list_ano_S
+        # time_limit: in seconds, for all the ILPs; once it is spent,
+        # the blocks without solution are solved until a first one
+        # solve_time_limit / mip_gap: for each ILP, the incumbent is
+        # kept when one of them is reached (see RK_Block_Solution.gap)
+        # merge_threshold: if set, consecutive K_C_nodes whose total time
+        # is below this fraction of the block's are merged before building
+        # the ILPs (see presolve.Coarse_K_graph)
+        set_method(solver)
+        ilp_limits.update(
+            time_limit=solve_time_limit,
+            mip_gap=mip_gap,
+            deadline=time.time() + time_limit if time_limit else None,
+            merge_threshold=merge_threshold,
+        )
         if mem_unit:
             self.mem_unit = mem_unit
         else:
             self.mem_unit = 1024 ** 2
         self.body = [None] * len(list_kg)
-        for cls in eq_classes:
-            l_kg = [list_kg[i] for i in cls]
-            l_block = get_rk_block(l_kg, nb_budget_abar, nb_budget_all)
+        l_l_kg = [[list_kg[i] for i in cls] for cls in eq_classes]
+        if list_ano_S is None:
+            list_ano_S = [None] * len(eq_classes)
+        if n_workers and n_workers > 1 and len(eq_classes) > 1:
+            # -> each class is an independent set of ILPs, its K_graphs
+            # -> are sent to a worker and its RK_Blocks sent back
+            nb = len(l_l_kg)
+            with ProcessPoolExecutor(min(n_workers, nb)) as pool:
+                l_l_block = list(
+                    pool.map(
+                        get_rk_block_in_worker,
+                        l_l_kg,
+                        [nb_budget_abar] * nb,
+                        [nb_budget_all] * nb,
+                        [solver] * nb,
+                        [ilp_limits] * nb,
+                        [n_workers // nb] * nb,
+                        [cache] * nb,
+                        list_ano_S,
+                    )
+                )
+        else:
+            l_l_block = [
+                get_rk_block(
+                    l_kg,
+                    nb_budget_abar,
+                    nb_budget_all,
+                    n_workers,
+                    cache,
+                    ano_sg,
+                )
+                for l_kg, ano_sg in zip(l_l_kg, list_ano_S)
+            ]
+        for cls, l_block in zip(eq_classes, l_l_block):
             for i, j in enumerate(cls):
                 self.body[j] = l_block[i]
 
@@ -268,16 +773,73 @@ class RK_Chain:
         self.ln = ln
         self.fw = fw
         self.bw = bw
+        self.ff_fw = ff_fw
+        self.nb_sol = nb_sol
+        # memory sizes in bytes, discretized by set_mem_unit
+        self.mem_sizes = (cw, cbw, fwd_tmp, bwd_tmp, ff_fwd_tmp)
+        if self.mem_unit == "auto":
+            self.mem_unit = self.auto_mem_unit()
+        self.set_mem_unit(self.mem_unit)
+
+    def discretize(self, values):
+        return [math.ceil(value / self.mem_unit) for value in values]
+
+    def set_mem_unit(self, mem_unit):
+        self.mem_unit = mem_unit
+        cw, cbw, fwd_tmp, bwd_tmp, ff_fwd_tmp = self.mem_sizes
         self.cw = self.discretize(cw)
         self.cbw = [self.discretize(x) for x in cbw]
         self.fwd_tmp = [self.discretize(x) for x in fwd_tmp]
         self.bwd_tmp = [self.discretize(x) for x in bwd_tmp]
         self.ff_fwd_tmp = self.discretize(ff_fwd_tmp)
-        self.ff_fw = ff_fw
-        self.nb_sol = nb_sol
 
-    def discretize(self, values):
-        return [math.ceil(value / self.mem_unit) for value in values]
+    def gcd_mem_unit(self):
+        # -> with this unit, discretize is exact
+        cw, cbw, fwd_tmp, bwd_tmp, ff_fwd_tmp = self.mem_sizes
+        values = cw + ff_fwd_tmp + [
+            v for l in cbw + fwd_tmp + bwd_tmp for v in l
+        ]
+        values = np.array([round(v) for v in values if v], dtype=np.int64)
+        return int(np.gcd.reduce(values)) if len(values) else 1
+
+    def auto_mem_unit(self, nb_units=1000):
+        """
+        Coarse unit: the largest multiple of gcd_mem_unit such that
+        the memory needed to keep everything (all the inputs, the
+        largest a_bar of each block and the largest temporary)
+        spans about nb_units units.
+        """
+        total = keep_all_mem(*self.mem_sizes)
+        gcd = self.gcd_mem_unit()
+        return max(gcd, int(total / nb_units) // gcd * gcd)
+
+    def max_useful_mem(self):
+        """
+        Memory (in mem_unit, as the m of the rotor DP tables) from which
+        the optimal time can't decrease anymore, cf keep_all_mem.
+        """
+        return keep_all_mem(
+            self.cw, self.cbw, self.fwd_tmp, self.bwd_tmp, self.ff_fwd_tmp
+        )
+
+    def rounding_loss_bound(self):
+        """
+        Rounding every size up to mem_unit overestimates the memory used
+        by any sequence by less than one unit per size involved: at most
+        one stored input or a_bar per block, the three terms of a block's
+        limit, plus the floor of the budget itself. Returns it in bytes.
+        """
+        return (self.ln + 4) * self.mem_unit
 
 
 # ==========================
+
+
+def keep_all_mem(cw, cbw, fwd_tmp, bwd_tmp, ff_fwd_tmp):
+    # enough to keep all the inputs, the largest a_bar of each block
+    # and the largest temporary: every block can use its fastest solution
+    return (
+        sum(cw)
+        + sum(max(l) for l in cbw if l)
+        + max(max(max(l) for l in fwd_tmp + bwd_tmp), max(ff_fwd_tmp))
+    )
@@ -0,0 +1,212 @@
+# ==========================
+# greedy block scheduler, without ILP solver
+# -> same interface as ModelGurobi/ModelMIP, see def_chain.get_rk_model
+# ==========================
+import time
+import numpy as np
+from rockmate.def_op import RunOp, DelOp, OpSchedule
+
+
+class ModelHeuristic:
+    """
+    Heuristic counterpart of the block ILP. The forward runs each
+    K_C_node once and keeps, among the K_D_nodes needed by the backward,
+    those with the highest recomputation time per byte, as many as the
+    save budget allows. The backward recomputes the missing ones just
+    before they are needed. Everything is deleted as soon as it is no
+    longer needed. There is no optimality guarantee: gap stays None
+    (unknown), as for CP.
+    """
+
+    def __init__(self, kg, budget, save_budget, gcd=None):
+        self.kg = kg
+        self.gcd = gcd if gcd else 1  # -> unused, budgets are in bytes
+        self.budget = budget
+        self.save_budget = save_budget
+        self.feasible = None
+        self.solve_time = None
+        self.solve_times = []
+        self.gap = None
+
+        T = len(kg.list_kcn)
+        I = len(kg.list_kdn)
+        kcn_idx = {kcn.name: k for k, kcn in enumerate(kg.list_kcn)}
+        kdn_idx = {kdn.name: i for i, kdn in enumerate(kg.list_kdn)}
+        self.loss_idx = kcn_idx[kg.loss_kcn.name]
+        self.output_grad_idx = kdn_idx[kg.output_kdn_grad.name]
+        self.time = [kcn.time for kcn in kg.list_kcn]
+        self.overhead = [kcn.overhead for kcn in kg.list_kcn]
+        self.mem = np.array([kdn.mem for kdn in kg.list_kdn], dtype=float)
+        self.is_phantom = ["phantom" in kdn.name for kdn in kg.list_kdn]
+        # -> same edges as in the ILP
+        self.deps_d = [  # kdn's parents
+            sorted(kcn_idx[kcn.name] for kcn in kdn.deps)
+            for kdn in kg.list_kdn
+        ]
+        self.users_d = [  # kdn's children
+            sorted(
+                kcn_idx[kcn.name]
+                for kcn in kdn.users_real
+                if kcn.name in kcn_idx
+            )
+            for kdn in kg.list_kdn
+        ]
+        self.users_c = [  # kcn's children
+            sorted(kdn_idx[kdn.name] for kdn in kcn.users)
+            for kcn in kg.list_kcn
+        ]
+        self.deps_c = [[] for _ in range(T)]  # kcn's parents
+        for i in range(I):
+            for k in self.users_d[i]:
+                self.deps_c[k].append(i)
+
+        # -> candidates to be kept for the backward, best ratio first
+        loss = self.loss_idx
+        candidates = [
+            i
+            for i in range(I)
+            if self.deps_d[i]
+            and min(self.deps_d[i]) < loss
+            and any(k > loss for k in self.users_d[i])
+        ]
+        ratio = lambda i: (
+            min(self.time[k] for k in self.deps_d[i]) / self.mem[i]
+            if self.mem[i] > 0
+            else float("inf")
+        )
+        self.candidates = sorted(candidates, key=ratio, reverse=True)
+
+    def set_budget(self, budget):
+        self.budget = budget
+
+    def add_abar_constraint(self, save_budget):
+        self.save_budget = save_budget
+
+    def simulate(self, keep):
+        """
+        Builds the schedule keeping the K_D_nodes of keep after the
+        forward. Returns the list of ("Run", k) / ("Del", i) ops with
+        the alive status after each of them, the memory saved at the
+        end of the forward and the peak memory.
+        """
+        loss = self.loss_idx
+        T = len(self.time)
+        I = len(self.mem)
+        alive = np.zeros(I + 2, dtype=bool)
+        alive[-1] = 1  # input_data_kdn
+        ops, alive_list = [], []
+        peak = 0
+        save = 0
+
+        def run(k):
+            nonlocal peak
+            if k == loss:
+                ops.append(("Run", k))
+                alive_list.append(alive.copy())
+                alive[self.output_grad_idx] = 1
+            alive[self.users_c[k]] = 1
+            ops.append(("Run", k))
+            alive_list.append(alive.copy())
+            peak = max(peak, self.mem @ alive[:I] + self.overhead[k])
+
+        def clean(needed):
+            # -> phantoms first, as in the ILP schedules
+            for phantom in [True, False]:
+                for i in np.flatnonzero(alive[:I]):
+                    if self.is_phantom[i] == phantom and not needed(i):
+                        alive[i] = 0
+                        ops.append(("Del", i))
+                        alive_list.append(alive.copy())
+
+        def restore(i):
+            # -> recompute i with its first producer, and its deps first
+            k = self.deps_d[i][0]
+            for j in self.deps_c[k]:
+                if not alive[j]:
+                    restore(j)
+            run(k)
+
+        # -- forward --
+        for k in range(loss + 1):
+            run(k)
+            if k == loss:
+                # -> as fwd_sched.save[-1]: before the output grad
+                save = self.mem @ alive_list[-2][:I]
+            # -> after the loss, only the output data and grad remain
+            # -> besides the kept ones, and the backward may need them
+            clean(
+                lambda i: any(loss >= u > k for u in self.users_d[i])
+                or (i in keep and any(u > k for u in self.users_d[i]))
+                or (k == loss and any(u > k for u in self.users_d[i]))
+                or any(p > k for p in self.deps_d[i])
+            )
+
+        # -- backward --
+        for k in range(loss + 1, T):
+            for i in self.deps_c[k]:
+                if not alive[i]:
+                    restore(i)
+            run(k)
+            clean(
+                lambda i: any(u > k for u in self.users_d[i])
+                or any(p > k for p in self.deps_d[i])
+            )
+        return ops, alive_list, save, peak
+
+    def solve(self, time_limit=None, mip_gap=None):
+        # time_limit, mip_gap: unused, as for an ILP model
+        start = time.time()
+        self.feasible = False
+        # -> largest prefix of candidates within save_budget,
+        # -> the saved memory grows with the prefix
+        lo, hi = 0, len(self.candidates)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            _, _, save, _ = self.simulate(set(self.candidates[:mid]))
+            if save <= self.save_budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        # -> then fewer until the peak fits in budget
+        for nb in range(lo, -1, -1):
+            ops, alive_list, save, peak = self.simulate(
+                set(self.candidates[:nb])
+            )
+            if save <= self.save_budget and peak <= self.budget:
+                self.feasible = True
+                self.ops, self.alive_list = ops, alive_list
+                break
+        self.solve_time = time.time() - start
+        self.solve_times.append(self.solve_time)
+
+    def schedule(self, kg=None):
+        kg = kg if kg else self.kg
+        assert self.feasible, "Cannot schedule an infeasible model!"
+        op_list = [
+            RunOp(kg.list_kcn[idx])
+            if op_type == "Run"
+            else DelOp(kg.list_kdn[idx])
+            for op_type, idx in self.ops
+        ]
+        alive_list = [alive.copy() for alive in self.alive_list]
+        for loss_i, (op_type, idx) in enumerate(self.ops):
+            if op_type == "Run" and idx == self.loss_idx:
+                break
+
+        fwd_sched = OpSchedule(
+            op_list[: loss_i + 1],
+            alive_list[: loss_i + 1],
+            kg.input_kdn_data,
+            kg.input_kdn_grad,
+            kg.output_kdn_data,
+            kg.list_kdn,
+        )
+        bwd_sched = OpSchedule(
+            op_list[loss_i + 1 :],
+            alive_list[loss_i + 1 :],
+            kg.input_kdn_data,
+            kg.input_kdn_grad,
+            kg.output_kdn_data,
+            kg.list_kdn,
+        )
+        return fwd_sched, bwd_sched
@@ -10,13 +10,21 @@ from rkgb.utils.small_fcts import get_device
 from rkgb.utils.ast_add_on import ast_to_str
 from rockmate.def_op import DelOp, OpSchedule
 from rockmate.def_chain import RK_Chain
+from rockmate.solution_cache import RK_Solution_Cache
 from rockmate.def_sequence import (
     SeqBlockBwd,
     SeqBlockFc,
     SeqBlockFn,
     SeqBlockFe,
 )
-from rockmate.rotor_solver import seq_builder, solve_dp_functionnal
+from rockmate.rotor_solver import (
+    seq_builder,
+    solve_dp_functionnal,
+    solve_refined,
+    get_frontier,
+    get_min_budget,
+    window_error_bound,
+)
 from rockmate.translator import Translator, RngState
 from rockmate.compiler import Compiler, RK_Storage
 import torch
@@ -58,11 +66,42 @@ class Rockmate(torch.nn.Module):
         nb_budget_save=10,
         nb_budget_peak=5,
         ilp_solver="gurobi",
-        solver="MIP"
+        solver="MIP",
+        compressed_dp=False,
+        dp_window=None,
+        n_workers=None,
+        solution_cache=None,
+        ilp_time_limit=None,
+        ilp_solve_time_limit=None,
+        ilp_mip_gap=None,
+        ilp_merge_threshold=None,
+        fused=False,
     ):
         super().__init__()
         ref_verbose[0] = verbose
         self.solver = solver
+        # -> store the DP table as breakpoints, for large budget//mem_unit
+        self.compressed_dp = compressed_dp
+        # -> approximate DP, with splits bounded to dp_window blocks
+        self.dp_window = dp_window
+        # -> number of processes used to solve the blocks' ILPs
+        self.n_workers = n_workers
+        # -> directory (or RK_Solution_Cache) where the blocks' solutions
+        # -> are kept, to skip the ILPs of already seen blocks
+        if isinstance(solution_cache, str):
+            solution_cache = RK_Solution_Cache(solution_cache)
+        self.solution_cache = solution_cache
+        # -> time limits (in seconds) of all the ILPs and of each one,
+        # -> and relative gap at which an ILP solve can stop
+        self.ilp_time_limit = ilp_time_limit
+        self.ilp_solve_time_limit = ilp_solve_time_limit
+        self.ilp_mip_gap = ilp_mip_gap
+        # -> presolve: merge consecutive nodes whose total time is below
+        # -> this fraction of their block's before building the ILPs
+        self.ilp_merge_threshold = ilp_merge_threshold
+        # -> compile each SeqBlock in a single function, run unless the
+        # -> memory is recorded or backward stops at an operation
+        self.fused = fused
         self.device = get_device()
         self.original_mod = original_mod
         self.mem_unit = mem_unit if mem_unit else 1024**2
@@ -92,14 +131,44 @@ class Rockmate(torch.nn.Module):
             nb_budget_save,
             nb_budget_peak,
             mem_unit=self.mem_unit,
-            solver=self.solver
+            solver=self.solver,
+            n_workers=self.n_workers,
+            cache=self.solution_cache,
+            list_ano_S=self.rkgb_res.list_ano_S,
+            time_limit=self.ilp_time_limit,
+            solve_time_limit=self.ilp_solve_time_limit,
+            mip_gap=self.ilp_mip_gap,
+            merge_threshold=self.ilp_merge_threshold,
         )
         end = time.time()
         self.ILP_solve_time = end - start
 
         self.opt_table = None
 
-    def get_sequence(self, budget):
+    def get_frontier(self, budget_max):
+        """
+        Solves the chain once for budget_max and returns the breakpoints
+        of the optimal time/budget curve (see rotor_solver.get_frontier).
+        Pass point.budget and point.get_sequence() to get_sequence
+        to use one of them without solving again.
+        """
+        mmax = budget_max // self.rk_chain.mem_unit - self.rk_chain.cw[0]
+        return get_frontier(self.rk_chain, mmax)
+
+    def get_min_budget(self, simulation_overhead=None, max_time=None):
+        """
+        Returns the RK_Frontier_Point with the smallest budget whose
+        simulation_overhead (resp. simulated time, max_time) is below the
+        given one, or None if it can't be reached. Then use
+        self.get_sequence(point.budget, seq=point.get_sequence()).
+        """
+        if max_time is None:
+            max_time = simulation_overhead * sum(
+                [kcn.time for kg in self.list_kg for kcn in kg.list_kcn]
+            )
+        return get_min_budget(self.rk_chain, max_time)
+
+    def get_sequence(self, budget, seq=None):
         for n, p in self.original_mod.named_parameters():
             if p.grad is None:
                 p.grad = torch.zeros_like(p)
@@ -130,11 +199,33 @@ class Rockmate(torch.nn.Module):
         print_debug("budget", self.budget)
         # -- solve the chain like rotor --
         start = time.time()
-        mmax = self.budget // self.mem_unit - self.rk_chain.cw[0]
-        self.opt_table = solve_dp_functionnal(self.rk_chain, mmax, self.opt_table)
-        self.seq = seq_builder(
-            self.rk_chain, self.budget // self.mem_unit, self.opt_table
-        )
+        if seq is not None:
+            self.seq = seq
+        elif self.mem_unit == "auto":
+            # -> start coarse again, the unit of rk_chain is refined
+            # -> for this budget so tables can't be reused
+            self.rk_chain.set_mem_unit(self.rk_chain.auto_mem_unit())
+            _, self.seq, self.opt_time_bounds = solve_refined(
+                self.rk_chain, self.budget, compressed=self.compressed_dp
+            )
+            self.rounding_loss_bound = self.rk_chain.rounding_loss_bound()
+        else:
+            mmax = self.budget // self.mem_unit - self.rk_chain.cw[0]
+            self.opt_table = solve_dp_functionnal(
+                self.rk_chain,
+                mmax,
+                self.opt_table,
+                compressed=self.compressed_dp,
+                window=self.dp_window,
+            )
+            if self.dp_window is not None:
+                self.dp_error_bound = window_error_bound(
+                    self.rk_chain, mmax, self.dp_window, self.opt_table
+                )[int(mmax)]
+                print_debug("DP error bound", self.dp_error_bound)
+            self.seq = seq_builder(
+                self.rk_chain, self.budget // self.mem_unit, self.opt_table
+            )
         end = time.time()
         self.DP_solve_time = end - start
 
@@ -216,12 +307,34 @@ class Rockmate(torch.nn.Module):
         )
         self.storage = RK_Storage(self.device, self.original_mod, self.dict_constants)
 
+    def get_segments(self):
+        # -> numbers of operations of each SeqBlock, see Compiler.compile
+        return [
+            len(seq.op_sched.op_list)
+            for seq in self.fwd_seq.seq + self.bwd_seq.seq
+        ]
+
     def get_compiled_fct(self):
+        self.compile_op_sched(
+            self.op_sched, len(self.fwd_op_list), self.get_segments()
+        )
+
+    def compile_op_sched(self, op_sched, loss_idx, segments=None):
+        # loss_idx: number of fwd operations of op_sched
         self.compiler = Compiler(self.storage)
-        self.fct_list = self.compiler.compile(self.op_sched)
-        loss_idx = len(self.fwd_op_list)
+        self.fct_list = self.compiler.compile(op_sched)
         self.fwd_fct_list = self.fct_list[:loss_idx]
         self.bwd_fct_list = self.fct_list[loss_idx:]
+        self.fwd_seg_list = self.bwd_seg_list = None
+        if self.fused and segments is not None:
+            # -> the fct_lists above are kept for record_mem and stop,
+            # -> which are per operation
+            seg_list = self.compiler.compile(op_sched, segments)
+            nb_fwd = int(
+                np.searchsorted(np.cumsum(segments), loss_idx, side="right")
+            )
+            self.fwd_seg_list = seg_list[:nb_fwd]
+            self.bwd_seg_list = seg_list[nb_fwd:]
 
     def _exec(self, fct_list, record_mem=False, compiled=False):
         if not compiled:
@@ -256,7 +369,10 @@ class Rockmate(torch.nn.Module):
         self.max_mem = []
         self.allo_mem = []
         if compiled:
-            for l in self.fwd_fct_list:
+            fct_lists = self.fwd_fct_list
+            if self.fwd_seg_list is not None and not record_mem:
+                fct_lists = self.fwd_seg_list
+            for l in fct_lists:
                 self._exec(l, record_mem, compiled=compiled)
             return self.storage.get_val(self.output.main_target)
 
@@ -277,7 +393,10 @@ class Rockmate(torch.nn.Module):
                 self._exec(l, record_mem, compiled=compiled)
             return None
         if compiled:
-            for l in self.bwd_fct_list:
+            fct_lists = self.bwd_fct_list
+            if self.bwd_seg_list is not None and not record_mem:
+                fct_lists = self.bwd_seg_list
+            for l in fct_lists:
                 self._exec(l, record_mem, compiled=compiled)
 
         if record_mem and add_output_grad:
@@ -322,6 +441,7 @@ class Rockmate(torch.nn.Module):
         sol = {}
         sol["op_sched"] = self.op_sched
         sol["loss_idx"] = len(self.fwd_op_list)
+        sol["segments"] = self.get_segments()
         with open(f"{path}/{id}_solution.pkl", "wb") as f:
             pickle.dump(sol, f)
 
@@ -330,8 +450,10 @@ class Rockmate(torch.nn.Module):
             sol = pickle.load(f)
         op_sched = sol["op_sched"]
         loss_idx = sol["loss_idx"]
+        segments = sol.get("segments")
+        if self.fused and segments is None:
+            warnings.warn(
+                "Solution saved without its SeqBlocks, it can't be fused"
+            )
         self.storage = RK_Storage(self.device, self.original_mod, self.dict_constants)
-        self.compiler = Compiler(self.storage)
-        self.fct_list = self.compiler.compile(op_sched)
-        self.fwd_fct_list = self.fct_list[:loss_idx]
-        self.bwd_fct_list = self.fct_list[loss_idx:]
+        self.compile_op_sched(op_sched, loss_idx, segments)
@@ -0,0 +1,183 @@
+# ==========================
+# presolve of the block ILPs: consecutive cheap K_C_nodes are
+# merged, the ILP is built on the coarser K_graph and its schedules
+# are expanded back to the nodes of the original K_graph
+# ==========================
+import copy
+import numpy as np
+from rockmate.def_op import RunOp, DelOp, OpSchedule
+
+
+def merge_groups(kg, merge_threshold):
+    """
+    Splits kg.list_kcn in groups of consecutive indices, all fwd or all
+    bwd, whose total time is at most merge_threshold times the time of
+    the whole block. The loss and the longer nodes stay alone.
+    As list_kcn is in topological order, so are the groups.
+    """
+    max_time = merge_threshold * sum(kcn.time for kcn in kg.list_kcn)
+    groups = []
+    group_time = 0
+    for k, kcn in enumerate(kg.list_kcn):
+        prev = kg.list_kcn[groups[-1][-1]] if groups else None
+        if (
+            prev is not None
+            and kcn is not kg.loss_kcn
+            and prev is not kg.loss_kcn
+            and kcn.is_fwd == prev.is_fwd
+            and group_time + kcn.time <= max_time
+        ):
+            groups[-1].append(k)
+            group_time += kcn.time
+        else:
+            groups.append([k])
+            group_time = kcn.time
+    return groups
+
+
+def ilp_size(kg):
+    # -> number of variables of the block ILP: R, S, P, create, delete
+    T = len(kg.list_kcn)
+    I = len(kg.list_kdn)
+    Cr = sum(len(kcn.users) for kcn in kg.list_kcn)
+    kcn_names = set(kcn.name for kcn in kg.list_kcn)
+    De = sum(
+        len(kdn.deps)
+        + len([kcn for kcn in kdn.users_real if kcn.name in kcn_names])
+        for kdn in kg.list_kdn
+    )
+    return T * T + T * Cr + T * I + T * Cr + T * De
+
+
+class Coarse_K_graph:
+    """
+    K_graph where each group of merge_groups is a single K_C_node, with
+    the sum of their times, the largest overhead and all their outputs.
+    The K_D_nodes are the same (copied, to point to the merged nodes),
+    so the alive status of the coarse schedules holds for the original
+    list_kdn. Peak memory is over-estimated, as every output of a group
+    is counted from its start.
+    """
+
+    def __init__(self, kg, merge_threshold):
+        self.groups = merge_groups(kg, merge_threshold)
+        group_of = {
+            kg.list_kcn[k].name: g
+            for g, group in enumerate(self.groups)
+            for k in group
+        }
+        self.list_kdn = [copy.copy(kdn) for kdn in kg.list_kdn]
+        kdn_copy = {kdn.name: c for kdn, c in zip(kg.list_kdn, self.list_kdn)}
+        self.list_kcn = []
+        for group in self.groups:
+            members = [kg.list_kcn[k] for k in group]
+            ckcn = copy.copy(members[0])
+            outputs = set(kdn.name for m in members for kdn in m.users)
+            if len(members) > 1:
+                ckcn.name = f"{members[0].name}..{members[-1].name}"
+            ckcn.time = sum(m.time for m in members)
+            ckcn.overhead = max(m.overhead for m in members)
+            ckcn.users = set(
+                kdn_copy.get(kdn.name, kdn) for m in members for kdn in m.users
+            )
+            ckcn.deps_real = set(
+                kdn_copy.get(kdn.name, kdn)
+                for m in members
+                for kdn in m.deps_real
+                if kdn.name not in outputs
+            )
+            ckcn.deps_fake = set(
+                kdn
+                for m in members
+                for kdn in m.deps_fake
+                if kdn.name not in outputs
+            )
+            ckcn.deps_global = set(
+                kdn
+                for m in members
+                for kdn in m.deps_global
+                if kdn.name not in outputs
+            )
+            ckcn.users_global = set(
+                kdn for m in members for kdn in m.users_global
+            )
+            self.list_kcn.append(ckcn)
+        to_coarse = lambda kcn: (
+            self.list_kcn[group_of[kcn.name]] if kcn.name in group_of else kcn
+        )
+        for kdn, ckdn in zip(kg.list_kdn, self.list_kdn):
+            ckdn.deps = set(to_coarse(kcn) for kcn in kdn.deps)
+            ckdn.users_real = set(to_coarse(kcn) for kcn in kdn.users_real)
+
+        self.loss_kcn = self.list_kcn[group_of[kg.loss_kcn.name]]
+        self.output_kdn_data = kdn_copy[kg.output_kdn_data.name]
+        self.output_kdn_grad = kdn_copy[kg.output_kdn_grad.name]
+        self.input_kdn_data = kg.input_kdn_data
+        self.input_kdn_grad = kg.input_kdn_grad
+
+        self.kcn_idx = {kcn.name: g for g, kcn in enumerate(self.list_kcn)}
+        self.kdn_idx = {kdn.name: i for i, kdn in enumerate(self.list_kdn)}
+        # outputs[g][j]: outputs of the first j+1 nodes of group g
+        I = len(self.list_kdn)
+        self.outputs = []
+        for group in self.groups:
+            mask = np.zeros(I + 2, dtype=bool)
+            self.outputs.append([])
+            for k in group:
+                for kdn in kg.list_kcn[k].users:
+                    mask[self.kdn_idx[kdn.name]] = 1
+                self.outputs[-1].append(mask.copy())
+        self.nb_vars = (ilp_size(kg), ilp_size(self))
+
+    def expand(self, op_sched, kg, alive):
+        """
+        Schedule of the nodes of kg (equivalent to the one the coarse
+        graph was built from) for a schedule of the coarse graph;
+        alive: the status before op_sched.
+        """
+        op_list = []
+        alive_list = []
+        for op, c_alive in zip(op_sched.op_list, op_sched.alive_list):
+            if op.op_type == "Del":
+                op_list.append(DelOp(kg.list_kdn[self.kdn_idx[op.name]]))
+                alive_list.append(c_alive.copy())
+            else:
+                g = self.kcn_idx[op.name]
+                for k, mask in zip(self.groups[g], self.outputs[g]):
+                    op_list.append(RunOp(kg.list_kcn[k]))
+                    alive_list.append(alive | (c_alive & mask))
+                # -> the last one has all the outputs, as c_alive
+                alive_list[-1] = c_alive.copy()
+            alive = c_alive
+        return OpSchedule(
+            op_list,
+            alive_list,
+            kg.input_kdn_data,
+            kg.input_kdn_grad,
+            kg.output_kdn_data,
+            kg.list_kdn,
+        )
+
+
+class Presolved_Model:
+    """
+    Block model (any of get_rk_model) built on a Coarse_K_graph, whose
+    schedules are expanded to the original K_graphs.
+    """
+
+    def __init__(self, md, ckg):
+        self.md = md
+        self.ckg = ckg
+
+    def __getattr__(self, name):
+        # -> set_budget, add_abar_constraint, solve, feasible, gap, ...
+        return getattr(self.md, name)
+
+    def schedule(self, kg):
+        fwd_sched, bwd_sched = self.md.schedule(self.ckg)
+        alive = np.zeros(len(kg.list_kdn) + 2, dtype=bool)
+        alive[-1] = 1  # input_data_kdn
+        return (
+            self.ckg.expand(fwd_sched, kg, alive),
+            self.ckg.expand(bwd_sched, kg, fwd_sched.alive_list[-1]),
+        )
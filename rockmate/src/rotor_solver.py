@@ -6,6 +6,8 @@
 
 from rkgb.utils import print_debug
 from rockmate.def_chain import RK_Chain
+import numpy as np
+import bisect
 from rockmate.def_sequence import (
     SeqBlockFn,
     SeqBlockFc,
@@ -160,6 +162,402 @@ def psolve_dp_functionnal(chain, mmax, opt_table=None):
     return (opt, what)
 
 
+def get_sum_ff_fw(chain):
+    # sum_ff_fw[a, j] == sum(ff_fw[a:j]), summed in the same order as
+    # -> psolve_dp_functionnal, so that all engines break ties alike
+    ln = chain.ln
+    sum_ff_fw = np.zeros((ln + 2, ln + 2))
+    for a in range(ln + 1):
+        sum_ff_fw[a, a + 1 :] = np.cumsum(chain.ff_fw[a : ln + 1])
+    return sum_ff_fw
+
+
+def nsolve_dp_functionnal(
+    chain, mmax, opt_table=None, window=None, lower_bound=False
+):
+    """Bottom-up NumPy version of psolve_dp_functionnal.
+    Returns the same (opt, what) contract, but array-backed:
+    opt[m][a][b]  : float, inf if infeasible
+    what[m][a][b] : int pair, (1, k) for a chain chkpt with solution k
+                    and (0, j) for a leaf chkpt, (-1, -1) if infeasible
+    Both are [m, a, b] views over tables stored as [a, b, m],
+    so each cell (a, b) is solved at once for a whole range of m.
+    If opt_table was already computed for a budget >= mmax,
+    it is returned as is. If it was computed for a smaller budget,
+    it is grown: the rows m <= old mmax are kept and only the new
+    rows are computed, since opt[m] only depends on opt[m' <= m].
+    Approximate mode: with a window, a leaf chkpt of [a, b] only
+    considers j <= a + window, so the DP is quadratic in chain.ln and
+    opt is an upper bound of the exact one. The other j are only tried
+    for the budgets where [a, b] is feasible but wouldn't be otherwise,
+    so opt is inf exactly where the exact one is, and window_error_bound
+    is finite wherever there is a schedule. With lower_bound=True, the
+    skipped j are replaced by a lower bound of their cost instead, and
+    opt is a lower bound of the exact one (what is then meaningless).
+    """
+    mmax = int(mmax)
+    M = mmax + 1
+    ln = chain.ln
+    if opt_table is None:
+        m0 = 0
+        opt = np.full((ln + 1, ln + 1, M), float("inf"))
+        what = np.full((ln + 1, ln + 1, M, 2), -1, dtype=np.int32)
+    else:
+        m0 = opt_table[0].shape[0]
+        if m0 >= M:
+            return opt_table
+        opt = np.full((ln + 1, ln + 1, M), float("inf"))
+        what = np.full((ln + 1, ln + 1, M, 2), -1, dtype=np.int32)
+        opt[:, :, :m0] = np.moveaxis(opt_table[0], 0, 2)
+        what[:, :, :m0] = np.moveaxis(opt_table[1], 0, 2)
+    W = M - m0  # nb of new rows, computed for m = m0...mmax
+
+    fw = chain.fw
+    bw = chain.bw
+    cw = chain.cw
+    cbw = chain.cbw
+    fwd_tmp = chain.fwd_tmp
+    bwd_tmp = chain.bwd_tmp
+    ff_fwd_tmp = chain.ff_fwd_tmp
+    nb_sol = chain.nb_sol
+    sum_ff_fw = get_sum_ff_fw(chain)
+    # each block needs at least one F_e, so the fastest one
+    # for all a <= i <= b costs at least acc_min_fe[b+1] - acc_min_fe[a]
+    acc_min_fe = np.concatenate(
+        ([0], np.cumsum([min(np.add(fw[i], bw[i])) for i in range(ln + 1)]))
+    )
+
+    # min_mem[a, b]: smallest m for which the exact opt[m][a][b] < inf,
+    # -> as feasibility only depends on these thresholds
+    cw_arr = np.array(cw)
+    min_mem = np.full((ln + 1, ln + 1), float("inf"))
+    fallback = window is not None and not lower_bound
+
+    def keep_best(best, best_what, cand, flag, idx):
+        # strict '<' keeps the first minimum, as min() does
+        better = cand < best
+        best[better] = cand[better]
+        best_what[better] = (flag, idx)
+
+    # -- Initialize borders of the tables for lmax-lmin = 0 --
+    for i in range(ln + 1):
+        for k in range(nb_sol[i]):
+            limit = max(
+                cw[i] + cbw[i + 1][k] + fwd_tmp[i][k],
+                cw[i] + cbw[i + 1][k] + bwd_tmp[i][k],
+            )
+            min_mem[i, i] = min(min_mem[i, i], limit)
+            lo = max(limit, m0)
+            if lo > mmax:
+                continue
+            cand = np.full(W, float("inf"))
+            cand[lo - m0 :] = fw[i][k] + bw[i][k]
+            keep_best(opt[i, i, m0:], what[i, i, m0:], cand, 1, k)
+
+    # -- dynamic program --
+    # -> opt[a, b] needs opt[j, b] for j > a and opt[a, j] for j < b
+    for a in range(ln - 1, -1, -1):
+        for b in range(a + 1, ln + 1):
+            mmin = cw[b + 1] + cw[a + 1] + ff_fwd_tmp[a]
+            if b > a + 1:
+                mmin = max(
+                    mmin,
+                    cw[b + 1]
+                    + max(
+                        cw[j] + cw[j + 1] + ff_fwd_tmp[j]
+                        for j in range(a + 1, b)
+                    ),
+                )
+            if fallback:
+                mm = np.min(
+                    np.maximum(
+                        cw_arr[a + 1 : b + 1] + min_mem[a + 1 : b + 1, b],
+                        min_mem[a, a:b],
+                    )
+                )
+                for k in range(nb_sol[a]):
+                    mm = min(
+                        mm,
+                        max(
+                            cw[a + 1] + cbw[a + 1][k] + fwd_tmp[a][k],
+                            cw[a] + cbw[a + 1][k] + bwd_tmp[a][k],
+                            cbw[a + 1][k] + min_mem[a + 1, b],
+                        ),
+                    )
+                min_mem[a, b] = max(mm, mmin)
+            if mmin > mmax:
+                continue
+
+            #  -- Solution 1 --
+            best_later = np.full(W, float("inf"))
+            what_later = np.full((W, 2), -1, dtype=np.int32)
+            jmax = b if window is None else min(b, a + window)
+            for j in range(a + 1, jmax + 1):
+                lo = max(cw[j], m0)
+                if lo > mmax:
+                    continue
+                cand = np.full(W, float("inf"))
+                cand[lo - m0 :] = (
+                    sum_ff_fw[a, j]
+                    + opt[j, b, lo - cw[j] : M - cw[j]]
+                    + opt[a, j - 1, lo:]
+                )
+                keep_best(best_later, what_later, cand, 0, j)
+            if lower_bound and jmax < b:
+                # -> for j > jmax, both sub-problems together need at least
+                # -> one F_e per block, and sum(ff_fw[a:j]) only grows
+                cand = np.full(
+                    W,
+                    sum_ff_fw[a, jmax + 1]
+                    + (acc_min_fe[b + 1] - acc_min_fe[a]),
+                )
+                keep_best(best_later, what_later, cand, 0, -1)
+
+            #  -- Solution 2 --
+            best_now = np.full(W, float("inf"))
+            what_now = np.full((W, 2), -1, dtype=np.int32)
+            for k in range(nb_sol[a]):
+                mem_f = cw[a + 1] + cbw[a + 1][k] + fwd_tmp[a][k]
+                mem_b = cw[a] + cbw[a + 1][k] + bwd_tmp[a][k]
+                lo = max(mem_f, mem_b, m0)
+                if lo > mmax:
+                    continue
+                c = cbw[a + 1][k]
+                cand = np.full(W, float("inf"))
+                cand[lo - m0 :] = (
+                    fw[a][k] + bw[a][k] + opt[a + 1, b, lo - c : M - c]
+                )
+                keep_best(best_now, what_now, cand, 1, k)
+
+            # -- best of 1 and 2 --
+            use_now = best_now < best_later
+            opt[a, b, m0:] = np.where(use_now, best_now, best_later)
+            what[a, b, m0:] = np.where(use_now[:, None], what_now, what_later)
+            if mmin > m0:
+                opt[a, b, m0:mmin] = float("inf")
+                what[a, b, m0:mmin] = -1
+
+            # -- j skipped by the window, where nothing else fits --
+            # -> feasible budgets are the m >= a threshold, so they are
+            # -> missing on [lo, hi): all those j are tried at once there
+            lo = max(int(min(min_mem[a, b], M)), m0)
+            if fallback and jmax < b and lo < M and np.isinf(opt[a, b, lo]):
+                found = np.flatnonzero(np.isfinite(opt[a, b, lo:]))
+                hi = lo + found[0] if len(found) else M
+                J = np.arange(jmax + 1, b + 1)[:, None]
+                R = np.arange(lo, hi)[None, :]
+                cols = R - cw_arr[J]
+                cand = (
+                    sum_ff_fw[a, J]
+                    + opt[J, b, np.maximum(cols, 0)]
+                    + opt[a, J - 1, R]
+                )
+                cand[cols < 0] = float("inf")
+                best = np.argmin(cand, axis=0)  # -> first minimum
+                best_cand = cand[best, np.arange(hi - lo)]
+                better = best_cand < float("inf")
+                opt[a, b, lo:hi][better] = best_cand[better]
+                what[a, b, lo:hi][better, 0] = 0
+                what[a, b, lo:hi][better, 1] = J[best[better], 0]
+
+    return (np.moveaxis(opt, 2, 0), np.moveaxis(what, 2, 0))
+
+
+def window_error_bound(chain, mmax, window, opt_table=None):
+    """
+    Returns, for m = 0...mmax, a guaranteed bound on the gap between the
+    optimal time found with nsolve_dp_functionnal(window=window), which
+    is given as opt_table or solved here, and the exact optimal time.
+    """
+    mmax = int(mmax)
+    if opt_table is None:
+        opt_table = nsolve_dp_functionnal(chain, mmax, window=window)
+    lower = nsolve_dp_functionnal(
+        chain, mmax, window=window, lower_bound=True
+    )[0]
+    upper = opt_table[0][: mmax + 1, 0, chain.ln]
+    lower = lower[:, 0, chain.ln]
+    # -> infeasible for both: no gap
+    with np.errstate(invalid="ignore"):
+        return np.where(upper == lower, 0, upper - lower)
+
+
+# ==============================
+# ==== BREAKPOINT DP TABLE =====
+# ==============================
+
+
+class RK_Breakpoint_Table:
+    """
+    Rotor DP table where each opt[.][a][b], which is non-increasing and
+    piecewise-constant in m, is stored as its breakpoints: the sorted
+    memory values where the optimal time (or, between equal times, the
+    choice) changes, with these times and the corresponding what choices,
+    so that it answers as the dense table. Queries are binary searches,
+    and the size of the table depends on the number of distinct solutions,
+    not on mmax.
+    Same interface as the C RkTable: get_opt(mmax) solves up to mmax.
+    """
+
+    def __init__(self, chain, mmax):
+        self.chain = chain
+        self.mmax = -1
+        self.get_opt(mmax)
+
+    def get_opt(self, mmax):
+        mmax = int(mmax)
+        if mmax > self.mmax:
+            # -> breakpoints above the old mmax were not computed
+            self.solve(mmax)
+        return self.opt_at(mmax, 0, self.chain.ln)
+
+    def opt_at(self, m, a, b):
+        ms, times, _ = self.cells[a][b]
+        idx = np.searchsorted(ms, m, side="right") - 1
+        return times[idx] if idx >= 0 else float("inf")
+
+    def what_at(self, m, a, b):
+        ms, _, whats = self.cells[a][b]
+        idx = np.searchsorted(ms, m, side="right") - 1
+        return tuple(whats[idx]) if idx >= 0 else (-1, -1)
+
+    def nb_breakpoints(self):
+        return sum(
+            len(cell[0]) for row in self.cells for cell in row if cell
+        )
+
+    def solve(self, mmax):
+        chain = self.chain
+        ln = chain.ln
+        fw = chain.fw
+        bw = chain.bw
+        cw = chain.cw
+        cbw = chain.cbw
+        fwd_tmp = chain.fwd_tmp
+        bwd_tmp = chain.bwd_tmp
+        ff_fwd_tmp = chain.ff_fwd_tmp
+        nb_sol = chain.nb_sol
+        sum_ff_fw = get_sum_ff_fw(chain)
+        cells = [[None] * (ln + 1) for _ in range(ln + 1)]
+
+        def evaluate(cell, xs):
+            ms, times, _ = cell
+            if len(ms) == 0:
+                return np.full(len(xs), float("inf"))
+            idx = np.searchsorted(ms, xs, side="right") - 1
+            return np.where(idx >= 0, times[idx], float("inf"))
+
+        def compress(xs, best, best_what):
+            # keep the first m of each time level, and the m where the
+            # -> choice changes between equal times (as in the dense table),
+            # -> drop the infeasible ones
+            prev = np.concatenate(([float("inf")], best[:-1]))
+            prev_what = np.concatenate(([(-1, -1)], best_what[:-1]))
+            keep = (best < prev) | (best_what != prev_what).any(axis=1)
+            return (xs[keep], best[keep], best_what[keep])
+
+        def keep_best(best, best_what, cand, flag, idx):
+            better = cand < best
+            best[better] = cand[better]
+            best_what[better] = (flag, idx)
+
+        # -- Initialize borders of the tables for lmax-lmin = 0 --
+        for i in range(ln + 1):
+            limits = [
+                max(
+                    cw[i] + cbw[i + 1][k] + fwd_tmp[i][k],
+                    cw[i] + cbw[i + 1][k] + bwd_tmp[i][k],
+                )
+                for k in range(nb_sol[i])
+            ]
+            xs = np.unique(np.array(limits, dtype=np.int64))
+            xs = xs[xs <= mmax]
+            best = np.full(len(xs), float("inf"))
+            best_what = np.full((len(xs), 2), -1, dtype=np.int32)
+            for k, limit in enumerate(limits):
+                cand = np.where(xs >= limit, fw[i][k] + bw[i][k], float("inf"))
+                keep_best(best, best_what, cand, 1, k)
+            cells[i][i] = compress(xs, best, best_what)
+
+        # -- dynamic program --
+        # -> the breakpoints of a cell are among the breakpoints
+        # -> of its candidates, so we evaluate them on their union
+        for a in range(ln - 1, -1, -1):
+            for b in range(a + 1, ln + 1):
+                mmin = cw[b + 1] + cw[a + 1] + ff_fwd_tmp[a]
+                if b > a + 1:
+                    mmin = max(
+                        mmin,
+                        cw[b + 1]
+                        + max(
+                            cw[j] + cw[j + 1] + ff_fwd_tmp[j]
+                            for j in range(a + 1, b)
+                        ),
+                    )
+                limits = [
+                    max(
+                        cw[a + 1] + cbw[a + 1][k] + fwd_tmp[a][k],
+                        cw[a] + cbw[a + 1][k] + bwd_tmp[a][k],
+                    )
+                    for k in range(nb_sol[a])
+                ]
+                l_xs = [[mmin]]
+                for j in range(a + 1, b + 1):
+                    l_xs.append([cw[j]])
+                    l_xs.append(cells[j][b][0] + cw[j])
+                    l_xs.append(cells[a][j - 1][0])
+                for k in range(nb_sol[a]):
+                    l_xs.append([limits[k]])
+                    l_xs.append(cells[a + 1][b][0] + cbw[a + 1][k])
+                xs = np.unique(np.concatenate(l_xs).astype(np.int64))
+                xs = xs[(xs >= mmin) & (xs <= mmax)]
+
+                #  -- Solution 1 --
+                best_later = np.full(len(xs), float("inf"))
+                what_later = np.full((len(xs), 2), -1, dtype=np.int32)
+                for j in range(a + 1, b + 1):
+                    cand = np.where(
+                        xs >= cw[j],
+                        sum_ff_fw[a, j]
+                        + evaluate(cells[j][b], xs - cw[j])
+                        + evaluate(cells[a][j - 1], xs),
+                        float("inf"),
+                    )
+                    keep_best(best_later, what_later, cand, 0, j)
+
+                #  -- Solution 2 --
+                best_now = np.full(len(xs), float("inf"))
+                what_now = np.full((len(xs), 2), -1, dtype=np.int32)
+                for k in range(nb_sol[a]):
+                    cand = np.where(
+                        xs >= limits[k],
+                        fw[a][k]
+                        + bw[a][k]
+                        + evaluate(cells[a + 1][b], xs - cbw[a + 1][k]),
+                        float("inf"),
+                    )
+                    keep_best(best_now, what_now, cand, 1, k)
+
+                # -- best of 1 and 2 --
+                use_now = best_now < best_later
+                cells[a][b] = compress(
+                    xs,
+                    np.where(use_now, best_now, best_later),
+                    np.where(use_now[:, None], what_now, what_later),
+                )
+
+        self.cells = cells
+        self.mmax = mmax
+
+
+def bsolve_dp_functionnal(chain, mmax, opt_table=None):
+    if opt_table is None:
+        opt_table = RK_Breakpoint_Table(chain, mmax)
+    else:
+        opt_table.get_opt(mmax)
+    return opt_table
+
+
 # ==========================
 #  ==== SEQUENCE BUILDER ====
 # ==========================
@@ -168,9 +566,14 @@ def psolve_dp_functionnal(chain, mmax, opt_table=None):
 def pseq_builder(chain, memory_limit, opt_table):
     # returns :
     # - the optimal sequence of computation using mem-persistent algo
-    mmax = memory_limit - chain.cw[0]
+    mmax = int(memory_limit - chain.cw[0])
     # opt, what = solve_dp_functionnal(chain, mmax, *opt_table)
-    opt, what = opt_table
+    if isinstance(opt_table, RK_Breakpoint_Table):
+        get_opt, get_what = opt_table.opt_at, opt_table.what_at
+    else:
+        opt, what = opt_table
+        get_opt = lambda m, a, b: opt[m][a][b]
+        get_what = lambda m, a, b: what[m][a][b]
     #  ~~~~~~~~~~~~~~~~~~
     def seq_builder_rec(lmin, lmax, cmem):
         seq = RK_Sequence()
@@ -180,7 +583,7 @@ def pseq_builder(chain, memory_limit, opt_table):
             raise ValueError(
                 "Can't find a feasible sequence with the given budget"
             )
-        if opt[cmem][lmin][lmax] == float("inf"):
+        if get_opt(cmem, lmin, lmax) == float("inf"):
             """
             print('a')
             print(chain.cw)
@@ -200,7 +603,7 @@ def pseq_builder(chain, memory_limit, opt_table):
             seq.insert(SeqLoss())
             return seq
 
-        w = what[cmem][lmin][lmax]
+        w = get_what(cmem, lmin, lmax)
         #  -- Solution 1 --
         if w[0]:
             k = w[1]
@@ -227,6 +630,70 @@ def pseq_builder(chain, memory_limit, opt_table):
     return seq
 
 
+# ==========================
+# ==== PARETO FRONTIER =====
+# ==========================
+
+
+class RK_Frontier_Point:
+    """
+    One breakpoint of the optimal time/budget curve: every memory limit
+    from self.memory_limit up to the next breakpoint reaches self.time.
+    The corresponding RK_Sequence is only built when asked for.
+    """
+
+    def __init__(self, chain, memory_limit, time, opt_table):
+        self.chain = chain
+        self.memory_limit = memory_limit  # in chain.mem_unit
+        self.budget = memory_limit * chain.mem_unit
+        self.time = time
+        self.opt_table = opt_table
+        self.seq = None
+
+    def get_sequence(self):
+        if self.seq is None:
+            self.seq = pseq_builder(
+                self.chain, self.memory_limit, self.opt_table
+            )
+        return self.seq
+
+    def __str__(self):
+        return f"Frontier point: budget {self.budget} -> time {self.time}"
+
+
+def get_frontier(chain, mmax, opt_table=None):
+    """
+    Returns the list of RK_Frontier_Point where opt[m][0][ln] improves,
+    for m = 0...mmax, in increasing budget order. A single table is
+    solved for mmax, and shared by all the points.
+    """
+    mmax = int(mmax)
+    opt_table = nsolve_dp_functionnal(chain, mmax, opt_table)
+    opt = opt_table[0][: mmax + 1, 0, chain.ln]
+    prev = np.concatenate(([float("inf")], opt[:-1]))
+    breakpoints = np.flatnonzero(opt < prev)
+    return [
+        RK_Frontier_Point(chain, int(m) + chain.cw[0], opt[m], opt_table)
+        for m in breakpoints
+    ]
+
+
+def get_min_budget(chain, target_time, mmax=None, opt_table=None):
+    """
+    Inverse query: returns the RK_Frontier_Point with the smallest memory
+    limit whose optimal time is <= target_time, or None if no budget
+    reaches it. By default, the frontier goes up to chain.max_useful_mem(),
+    where the fastest solution is available for every block.
+    """
+    if mmax is None:
+        mmax = chain.max_useful_mem()
+    frontier = get_frontier(chain, mmax, opt_table)
+    # -> times decrease along the frontier
+    times = [-point.time for point in frontier]
+    i = bisect.bisect_left(times, -target_time)
+    return frontier[i] if i < len(frontier) else None
+
+
 # ===================================
 # =====  interface to C version =====
 # ===================================
@@ -260,10 +727,14 @@ def convert_sequence_from_C(chain: RK_Chain, original_sequence):
 
 
 def csolve_dp_functionnal(chain: RK_Chain, mmax, opt_table=None):
-    if opt_table is None:  ## TODO? if opt_table.mmax < mmax, create new table
-        result = rs.RkTable(chain, mmax)
-    else:
-        result = opt_table
+    if opt_table is not None:
+        try:
+            opt_table.get_opt(mmax)
+            return opt_table
+        except ValueError:
+            # the C table can't grow: opt_table.mmax < mmax, create new table
+            pass
+    result = rs.RkTable(chain, mmax)
     result.get_opt(mmax)
     return result
 
@@ -278,9 +749,20 @@ def cseq_builder(chain: RK_Chain, mmax, opt_table):
 # ===============================================
 
 
-def solve_dp_functionnal(chain, mmax, opt_table=None, force_python=False):
+def solve_dp_functionnal(
+    chain,
+    mmax,
+    opt_table=None,
+    force_python=False,
+    compressed=False,
+    window=None,
+):
+    if window is not None:
+        return nsolve_dp_functionnal(chain, mmax, opt_table, window=window)
+    if compressed:
+        return bsolve_dp_functionnal(chain, int(mmax), opt_table)
     if force_python or not csolver_present:
-        return psolve_dp_functionnal(chain, mmax, opt_table)
+        return nsolve_dp_functionnal(chain, mmax, opt_table)
     else:
         return csolve_dp_functionnal(chain, int(mmax), opt_table)
 
@@ -291,3 +773,40 @@ def seq_builder(chain, mmax, opt_table):
     else:
         return pseq_builder(chain, mmax, opt_table)
 
+
+def solve_refined(
+    chain, budget, refine_factor=4, nb_refine=3, compressed=False
+):
+    """
+    Coarse-to-fine solve for one budget (in bytes), starting from the
+    current chain.mem_unit. Since sizes are rounded up, the DP at budget
+    is pessimistic, while the DP at budget + chain.rounding_loss_bound()
+    is optimistic: their times bound the exact optimal time. The unit is
+    divided by refine_factor, at most nb_refine times, until both agree
+    or the unit is exact (chain.gcd_mem_unit()). Returns the opt_table,
+    the sequence and the (lower, upper) bounds on the optimal time.
+    """
+    gcd = chain.gcd_mem_unit()
+    for i in range(nb_refine + 1):
+        if i > 0:
+            unit = chain.mem_unit // refine_factor // gcd * gcd
+            chain.set_mem_unit(max(unit, gcd))
+        bound = chain.rounding_loss_bound()
+        memory_limit = budget // chain.mem_unit
+        mmax = memory_limit - chain.cw[0]
+        mmax_opt = (budget + bound) // chain.mem_unit - chain.cw[0]
+        if compressed:
+            opt_table = bsolve_dp_functionnal(chain, max(mmax_opt, 0))
+            opt_at = lambda m: opt_table.opt_at(m, 0, chain.ln)
+        else:
+            opt_table = nsolve_dp_functionnal(chain, max(mmax_opt, 0))
+            opt_at = lambda m: opt_table[0][m][0][chain.ln]
+        upper = opt_at(mmax) if mmax >= 0 else float("inf")
+        lower = opt_at(mmax_opt) if mmax_opt >= 0 else float("inf")
+        print_debug(
+            f"mem_unit {chain.mem_unit}: optimal time in [{lower}, {upper}]"
+        )
+        if upper <= lower or chain.mem_unit == gcd:
+            break
+    seq = pseq_builder(chain, memory_limit, opt_table)
+    return opt_table, seq, (lower, upper)
@@ -0,0 +1,162 @@
+# ==========================
+# on-disk cache of the solutions of the blocks' ILPs
+# -> solutions are stored by index in list_kcn/list_kdn, so they
+# -> can be used by any K_graph of the same anonymized block
+# ==========================
+import os
+import pickle
+import hashlib
+import numpy as np
+from rockmate.def_op import RunOp, DelOp, OpSchedule
+
+CACHE_VERSION = 2
+
+
+def graph_fingerprint(ano_sg):
+    """
+    Stable description of an anonymized S_graph (as given by
+    rkgb's S_list_to_K_list_eco): code, targets and edges of each node.
+    It doesn't depend on the real names, so two equivalent blocks, of the
+    same model or not, have the same fingerprint.
+    """
+    l = []
+    for sn in ano_sg.nodes:
+        l.append(sn.full_code())
+        l.append(
+            sorted(
+                (sn_dep.main_target, sorted(edge))
+                for sn_dep, edge in sn.deps.items()
+            )
+        )
+        l.append(
+            (
+                sn.all_targets,
+                sn.tensor_targets,
+                sn.inplace_targets,
+                sn.container_targets,
+                sn.is_rand,
+                sn.protected,
+            )
+        )
+    l.append((ano_sg.direct_outputs, ano_sg.hidden_output))
+    return l
+
+
+def costs_fingerprint(kg, digits=3):
+    # -> measured costs, rounded to digits significant digits
+    rnd = lambda x: float(f"{float(x or 0):.{digits}g}")
+    return (
+        [(rnd(kcn.time), rnd(kcn.overhead)) for kcn in kg.list_kcn],
+        [rnd(kdn.mem) for kdn in kg.list_kdn],
+        rnd(kg.input_kdn_data.mem),
+        rnd(kg.output_kdn_data.mem),
+    )
+
+
+def encode_sched(op_sched, kg):
+    kcn_idx = {kcn.name: k for k, kcn in enumerate(kg.list_kcn)}
+    kdn_idx = {kdn.name: i for i, kdn in enumerate(kg.list_kdn)}
+    ops = [
+        (
+            op.op_type,
+            kcn_idx[op.name] if op.op_type == "Run" else kdn_idx[op.name],
+        )
+        for op in op_sched.op_list
+    ]
+    return ops, np.array(op_sched.alive_list, dtype=bool)
+
+
+def decode_sched(encoded, kg):
+    ops, alive_list = encoded
+    op_list = [
+        RunOp(kg.list_kcn[idx])
+        if op_type == "Run"
+        else DelOp(kg.list_kdn[idx])
+        for op_type, idx in ops
+    ]
+    return OpSchedule(
+        op_list,
+        list(alive_list),
+        kg.input_kdn_data,
+        kg.input_kdn_grad,
+        kg.output_kdn_data,
+        kg.list_kdn,
+    )
+
+
+class RK_Solution_Cache:
+    """
+    Content-addressed cache of the solutions found by get_rk_block.
+    Each entry is a pickle file named by the hash of the block's
+    fingerprint, its costs, the budget grid and the solver settings.
+    When the files exceed max_size bytes, the least recently used
+    ones are removed.
+    """
+
+    def __init__(self, path, max_size=2 ** 30, digits=3):
+        self.path = path
+        self.max_size = max_size
+        # digits: significant digits kept from the measured costs
+        self.digits = digits
+        os.makedirs(path, exist_ok=True)
+
+    def block_key(self, ano_sg, kg, nb_bdg_abar, nb_bdg_all, solver):
+        if ano_sg is None:
+            return None
+        desc = (
+            CACHE_VERSION,
+            graph_fingerprint(ano_sg),
+            costs_fingerprint(kg, self.digits),
+            nb_bdg_abar,
+            nb_bdg_all,
+            solver,
+        )
+        return hashlib.sha256(repr(desc).encode()).hexdigest()
+
+    def file(self, key):
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def get(self, key):
+        if key is None or not os.path.exists(self.file(key)):
+            return None
+        try:
+            with open(self.file(key), "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(self.file(key))  # -> most recently used
+        except OSError:
+            # -> evicted by another process since it was read
+            pass
+        return value
+
+    def put(self, key, value):
+        if key is None:
+            return
+        # -> written under another name first, so that a concurrent
+        # -> reader never sees a partial file
+        tmp = f"{self.file(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f)
+        os.replace(tmp, self.file(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(".pkl"):
+                try:
+                    st = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+            total -= size
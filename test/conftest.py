@@ -0,0 +1,41 @@
+import random
+import pytest
+import torch
+import rkgb
+
+
+class Block(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.l1 = torch.nn.Linear(8, 8)
+        self.l2 = torch.nn.Linear(8, 8)
+
+    def forward(self, x):
+        y = torch.relu(self.l1(x))
+        z = torch.tanh(self.l2(y))
+        return x + z * y
+
+
+@pytest.fixture(scope="module")
+def graphs():
+    return rkgb.make_all_graphs(
+        Block(),
+        [torch.randn(4, 8)],
+        bool_list_sg=False,
+        bool_list_kg=False,
+        check_device_is_gpu=False,
+    )
+
+
+@pytest.fixture(scope="module")
+def kg(graphs):
+    kg = graphs.K_graph
+    # -> nothing is measured on CPU, so we give each node a random
+    # -> time and size, in units of 1024
+    r = random.Random(0)
+    for kcn in kg.list_kcn:
+        kcn.time = 0 if "loss" in kcn.name else r.randint(1, 10)
+        kcn.overhead = r.randint(0, 2) * 1024
+    for kdn in kg.list_kdn:
+        kdn.mem = r.randint(1, 4) * 1024
+    return kg
@@ -0,0 +1,75 @@
+import random
+from types import SimpleNamespace
+import pytest
+import torch
+from rockmate.compiler import Compiler, RK_Storage
+
+NAMES = [
+    "fwd_a",
+    "bwd_a",
+    "fwd_b",
+    "bwd_b",
+    "del a data",
+    "del b data",
+    "del a grad",
+    "fwd_loss",
+]
+
+
+@pytest.fixture(scope="module")
+def compiler():
+    storage = RK_Storage(torch.device("cpu"), torch.nn.Module(), {})
+    return Compiler(storage)
+
+
+def index(compiler, seed):
+    r = random.Random(seed)
+    op_name_list = [r.choice(NAMES) for _ in range(r.randint(1, 40))]
+    kdn_names = [r.choice(NAMES) for _ in range(r.randint(1, 10))]
+    compiler.op_sched = SimpleNamespace(
+        op_name_list=op_name_list, kdn_names=kdn_names
+    )
+    compiler._index_op_sched()
+    return op_name_list, kdn_names
+
+
+# -> the slice-and-index queries compile used before the index
+
+
+def old_find(l, name, start, end=None):
+    sub = l[start:end]
+    return start + sub.index(name) if name in sub else None
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_index_same_as_slices(compiler, seed):
+    l, kdn_names = index(compiler, seed)
+    for i, name in enumerate(l):
+        rec = name in l[:i]
+        assert (compiler.prev_idx[i] is not None) == rec
+        if rec:
+            prev_i = i - l[:i][::-1].index(name) - 1
+            assert compiler.prev_idx[i] == prev_i
+        last = name not in l[i + 1 :]
+        assert (compiler.next_idx[i] is None) == last
+        bwd_name = name.replace("fwd", "bwd")
+        if bwd_name in l[i:]:
+            next_bwd_idx = i + l[i:].index(bwd_name)
+            assert compiler._find(bwd_name, i) == next_bwd_idx
+            last_before_bwd = name not in l[i + 1 : next_bwd_idx]
+            assert last_before_bwd == (
+                not (
+                    compiler.next_idx[i] is not None
+                    and compiler.next_idx[i] < next_bwd_idx
+                )
+            )
+        else:
+            assert compiler._find(bwd_name, i) is None
+    for name in NAMES + ["missing"]:
+        for start in range(len(l) + 1):
+            for end in [None] + list(range(start, len(l) + 2)):
+                assert compiler._find(name, start, end) == old_find(
+                    l, name, start, end
+                )
+    for name in kdn_names:
+        assert compiler.kdn_idx[name] == kdn_names.index(name)
@@ -0,0 +1,92 @@
+import random
+import pytest
+import torch
+from rockmate import Rockmate
+from rockmate.compiler import RK_Storage
+
+
+def make_model():
+    return torch.nn.Sequential(
+        *[
+            torch.nn.Sequential(
+                torch.nn.Linear(16, 16),
+                torch.nn.ReLU(),
+                torch.nn.Linear(16, 16),
+                torch.nn.Tanh(),
+            )
+            for _ in range(4)
+        ]
+    )
+
+
+@pytest.fixture(scope="module")
+def sample():
+    torch.manual_seed(0)
+    return torch.randn(8, 16)
+
+
+@pytest.fixture(scope="module")
+def rk(sample):
+    torch.manual_seed(0)
+    rk = Rockmate(make_model(), [sample], solver="HiGHS", solve=False)
+    # -> nothing is measured on CPU: with random costs and a small
+    # -> budget, the schedule recomputes some of the blocks
+    r = random.Random(0)
+    for kg in rk.list_kg:
+        for kcn in kg.list_kcn:
+            kcn.time = 0 if "loss" in kcn.name else r.randint(1, 10)
+        for kdn in kg.list_kdn:
+            kdn.mem = r.randint(1, 4) * 1024**2
+    total = sum(kdn.mem for kg in rk.list_kg for kdn in kg.list_kdn)
+    rk.get_chain()
+    rk.get_sequence(total * 0.4)
+    return rk
+
+
+def run(rk, sample, fused, compile=True):
+    rk.fused = fused
+    if compile:
+        rk.storage = RK_Storage(rk.device, rk.original_mod, rk.dict_constants)
+        rk.get_compiled_fct()
+    assert (rk.fwd_seg_list is not None) == fused
+    for p in rk.original_mod.parameters():
+        p.grad.zero_()
+    y = rk(sample)
+    # -> the output is freed during the backward
+    output = y.detach().clone()
+    y.mean().backward()
+    rk.backward()
+    return (
+        output,
+        [p.grad.clone() for p in rk.original_mod.parameters()],
+        dict(rk.storage.pack_counts),
+    )
+
+
+def assert_same_run(res, ref):
+    y, grads, pack_counts = res
+    assert torch.equal(y, ref[0])
+    assert all(torch.equal(g, g_ref) for g, g_ref in zip(grads, ref[1]))
+    assert pack_counts == ref[2]
+
+
+def test_fused_same_as_per_op(rk, sample):
+    # -> the schedule has checkpoints (F_c) and recomputations
+    assert any("Fc" in str(seq) for seq in rk.fwd_seq.seq)
+    ref = run(rk, sample, fused=False)
+    assert_same_run(run(rk, sample, fused=True), ref)
+    # -> and both match the original module
+    model = make_model()
+    model.load_state_dict(rk.original_mod.state_dict())
+    model(sample).mean().backward()
+    assert torch.allclose(ref[0], model(sample))
+    for g, p in zip(ref[1], model.parameters()):
+        assert torch.allclose(g, p.grad)
+
+
+def test_fused_load_from_file(rk, sample, tmp_path):
+    ref = run(rk, sample, fused=False)
+    rk.save_to_file(tmp_path, id="fused")
+    rk.fused = True
+    rk.load_from_file(tmp_path, id="fused")
+    assert_same_run(run(rk, sample, fused=True, compile=False), ref)
@@ -0,0 +1,31 @@
+import pytest
+from rockmate.ILP_HiGHS import ModelHiGHS
+
+pytest.importorskip("mip")
+from rockmate.ILP_MIP import ModelMIP
+
+
+def peak(sched):
+    return max(sched.save + sched.tmp)
+
+
+@pytest.mark.parametrize("frac", [1, 0.6, 0.55, 0.4])
+def test_highs_same_objective_as_mip(kg, frac):
+    total = sum(kdn.mem for kdn in kg.list_kdn)
+    budget, save_budget = total * frac, total * 0.25
+    models = [
+        Model(kg, budget, save_budget, gcd=1024)
+        for Model in [ModelMIP, ModelHiGHS]
+    ]
+    for md in models:
+        md.solve(mip_gap=0)
+    md_mip, md_highs = models
+    assert md_highs.feasible == md_mip.feasible
+    if not md_highs.feasible:
+        return
+    fwd_mip, bwd_mip = md_mip.schedule()
+    fwd, bwd = md_highs.schedule()
+    assert fwd.time + bwd.time == fwd_mip.time + bwd_mip.time
+    # -> OpSchedule already checked that each op finds its deps alive
+    assert peak(fwd) <= budget and peak(bwd) <= budget
+    assert fwd.save[-1] <= save_budget
@@ -0,0 +1,124 @@
+import random
+import pytest
+from rockmate.rotor_solver import (
+    psolve_dp_functionnal,
+    nsolve_dp_functionnal,
+    bsolve_dp_functionnal,
+    pseq_builder,
+)
+
+
+class FakeSched:
+    def __init__(self, time):
+        self.time = time
+        self.save = [0]
+        self.overhead = 0
+
+
+class FakeSol:
+    def __init__(self, fw, bw):
+        self.fwd_sched = FakeSched(fw)
+        self.bwd_sched = FakeSched(bw)
+
+
+class FakeBlock:
+    def __init__(self, fw, bw, ff_fw):
+        self.sols = [FakeSol(f, b) for f, b in zip(fw, bw)]
+        self.Fc_sched = FakeSched(ff_fw)
+        self.Fn_sched = FakeSched(ff_fw)
+
+
+class FakeChain:
+    """
+    Random chain with the fields of an RK_Chain read by the rotor DP
+    and by pseq_builder, with small memory values so that a few hundred
+    budgets go from infeasible to storing everything.
+    """
+
+    def __init__(self, ln, seed=0, nb_sol=3, scale=20):
+        r = random.Random(seed)
+        self.ln = ln
+        self.nb_sol = [r.randint(1, nb_sol) for _ in range(ln)] + [1]
+        self.fw = [[r.uniform(1, 10) for _ in range(n)] for n in self.nb_sol]
+        self.bw = [[r.uniform(1, 20) for _ in range(n)] for n in self.nb_sol]
+        self.cw = [r.randint(0, scale) for _ in range(ln + 1)] + [0]
+        self.cbw = [[]] + [
+            [r.randint(0, 3 * scale) for _ in range(n)] for n in self.nb_sol
+        ]
+        self.fwd_tmp = [
+            [r.randint(0, scale) for _ in range(n)] for n in self.nb_sol
+        ]
+        self.bwd_tmp = [
+            [r.randint(0, scale) for _ in range(n)] for n in self.nb_sol
+        ]
+        self.ff_fwd_tmp = [r.randint(0, scale) for _ in range(ln + 1)]
+        self.ff_fw = [r.uniform(0.5, 8) for _ in range(ln + 1)]
+        # -> for the Loss block
+        self.fw[-1], self.bw[-1], self.cbw[-1] = [0], [0], [0]
+        self.fwd_tmp[-1], self.bwd_tmp[-1] = [0], [0]
+        self.ff_fwd_tmp[-1], self.ff_fw[-1] = 0, 0
+        self.body = [
+            FakeBlock(self.fw[i], self.bw[i], self.ff_fw[i]) for i in range(ln)
+        ]
+
+
+def random_chain(seed):
+    return FakeChain(random.Random(seed).randint(1, 7), seed=seed)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("mmax", [0, 40, 150])
+def test_nsolve_same_table_as_psolve(seed, mmax):
+    chain = random_chain(seed)
+    opt, what = psolve_dp_functionnal(chain, mmax)
+    nopt, nwhat = nsolve_dp_functionnal(chain, mmax)
+    assert nopt.shape[0] == mmax + 1
+    for m in opt:
+        for a in opt[m]:
+            for b in opt[m][a]:
+                assert nopt[m][a][b] == opt[m][a][b]
+                if opt[m][a][b] < float("inf"):
+                    flag, idx = nwhat[m][a][b]
+                    assert (bool(flag), idx) == tuple(what[m][a][b])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_grown_table_same_as_fresh_solve(seed):
+    chain = random_chain(seed)
+    full_opt, full_what = nsolve_dp_functionnal(chain, 200)
+    opt_table = None
+    for mmax in [0, 3, 17, 60, 61, 150, 200]:
+        opt_table = nsolve_dp_functionnal(chain, mmax, opt_table)
+        opt, what = opt_table
+        assert (opt == full_opt[: mmax + 1]).all()
+        assert (what == full_what[: mmax + 1]).all()
+    # -> already solved for a larger budget
+    assert nsolve_dp_functionnal(chain, 100, opt_table) is opt_table
+
+
+def seq_names(chain, memory_limit, opt_table):
+    try:
+        seq = pseq_builder(chain, memory_limit, opt_table)
+    except ValueError:
+        return None
+    return [(type(op).__name__, getattr(op, "index", None)) for op in seq.seq]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_breakpoint_table_same_as_dense_table(seed):
+    chain = random_chain(seed)
+    mmax = 200
+    opt, what = nsolve_dp_functionnal(chain, mmax)
+    # -> grown from a smaller budget, as in solve_dp_functionnal
+    table = bsolve_dp_functionnal(chain, 50)
+    table = bsolve_dp_functionnal(chain, mmax, table)
+    for m in range(mmax + 1):
+        for a in range(chain.ln + 1):
+            for b in range(a, chain.ln + 1):
+                assert table.opt_at(m, a, b) == opt[m][a][b]
+                assert table.what_at(m, a, b) == tuple(what[m][a][b])
+    for m in range(0, mmax + 1, 5):
+        memory_limit = m + chain.cw[0]
+        assert seq_names(chain, memory_limit, table) == seq_names(
+            chain, memory_limit, (opt, what)
+        )
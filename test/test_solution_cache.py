@@ -0,0 +1,61 @@
+import os
+import pickle
+import numpy as np
+from rockmate.ILP_HiGHS import ModelHiGHS
+from rockmate.solution_cache import (
+    RK_Solution_Cache,
+    encode_sched,
+    decode_sched,
+)
+
+
+def test_encode_decode_round_trip(kg):
+    total = sum(kdn.mem for kdn in kg.list_kdn)
+    md = ModelHiGHS(kg, total * 0.55, total * 0.25, gcd=1024)
+    md.solve()
+    for op_sched in md.schedule():
+        # -> as stored in the cache
+        encoded = pickle.loads(pickle.dumps(encode_sched(op_sched, kg)))
+        decoded = decode_sched(encoded, kg)
+        assert [(op.op_type, op.name) for op in decoded.op_list] == [
+            (op.op_type, op.name) for op in op_sched.op_list
+        ]
+        assert np.array_equal(decoded.alive_list, op_sched.alive_list)
+        assert decoded.time == op_sched.time
+        assert np.array_equal(decoded.save, op_sched.save)
+        assert decoded.overhead == op_sched.overhead
+
+
+def test_get_missing_or_none_key(tmp_path):
+    cache = RK_Solution_Cache(tmp_path)
+    assert cache.get("0" * 64) is None
+    assert cache.get(None) is None
+    cache.put(None, "value")
+    assert os.listdir(tmp_path) == []
+
+
+def test_lru_eviction(tmp_path):
+    value = b"x" * 1000
+    size = len(pickle.dumps(value))
+    cache = RK_Solution_Cache(tmp_path, max_size=3 * size)
+    for i, key in enumerate("abc"):
+        cache.put(key, value)
+        # -> a used before b, before c
+        os.utime(cache.file(key), (1000 + i, 1000 + i))
+    assert cache.get("a") == value  # -> a is now the most recently used
+    cache.put("d", value)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == [value] * 3
+    assert sorted(os.listdir(tmp_path)) == ["a.pkl", "c.pkl", "d.pkl"]
+
+
+def test_get_entry_evicted_after_read(tmp_path, monkeypatch):
+    # -> another process removes the file between the read and the utime
+    cache = RK_Solution_Cache(tmp_path)
+    cache.put("a", "value")
+
+    def utime(path, *args):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", utime)
+    assert cache.get("a") == "value"
@@ -0,0 +1,121 @@
+import os
+import time
+import pytest
+from rockmate import def_chain
+from rockmate.solution_cache import RK_Solution_Cache
+
+
+class FakeSched:
+    time = 1
+    overhead = 0
+    save = [0]
+
+
+class FakeModel:
+    """
+    Block model which records the (time_limit, mip_gap) of each solve,
+    with the interface used by get_rk_solution.
+    """
+
+    def __init__(self, feasible=True, gap=0.0, solve_time=0):
+        self.limits = []
+        self.is_feasible = feasible
+        self.reported_gap = gap
+        self.time_to_solve = solve_time
+
+    def set_budget(self, budget):
+        pass
+
+    def add_abar_constraint(self, save_budget):
+        pass
+
+    def solve(self, time_limit=None, mip_gap=None):
+        self.limits.append((time_limit, mip_gap))
+        self.feasible = self.is_feasible
+        self.gap = self.reported_gap
+        self.solve_time = self.time_to_solve
+
+    def schedule(self, kg=None):
+        return FakeSched(), FakeSched()
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(def_chain, "method", "HiGHS", raising=False)
+    for key, value in [
+        ("time_limit", None),
+        ("mip_gap", None),
+        ("deadline", None),
+        ("merge_threshold", None),
+        ("first_solution_time_limit", 60),
+    ]:
+        monkeypatch.setitem(def_chain.ilp_limits, key, value)
+    return def_chain.ilp_limits
+
+
+def test_limits_given_to_each_solve(limits):
+    limits.update(time_limit=5, mip_gap=0.01, deadline=time.time() + 100)
+    md = FakeModel()
+    sols, complete = def_chain.get_rk_solution([None], [3, 2, 1], 10, md)
+    assert md.limits == [(5, 0.01)] * 3
+    assert all(sols) and complete
+
+
+def test_time_limit_cut_to_deadline(limits):
+    limits.update(time_limit=100, deadline=time.time() + 10)
+    md = FakeModel()
+    def_chain.get_rk_solution([None], [1], 10, md)
+    assert 0 < md.limits[0][0] <= 10
+
+
+def test_first_solution_after_deadline(limits):
+    # -> only a global budget, already spent: the block still needs
+    # -> a solution, searched with a finite limit
+    limits.update(deadline=time.time() - 1)
+    md = FakeModel()
+    sols, complete = def_chain.get_rk_solution([None], [3, 2, 1], 10, md)
+    assert md.limits == [(60, None)]
+    assert sols[0] and sols[1:] == [False, False]
+    assert not complete
+
+
+def test_no_solve_after_deadline_once_found(limits):
+    limits.update(deadline=time.time() - 1)
+    md = FakeModel()
+    sols, complete = def_chain.get_rk_solution(
+        [None], [3, 2], 10, md, found=True
+    )
+    assert md.limits == []
+    assert sols == [False, False] and not complete
+
+
+def test_stopped_at_time_limit(limits):
+    limits.update(time_limit=5)
+    md = FakeModel(solve_time=5)
+    sols, complete = def_chain.get_rk_solution([None], [1], 10, md)
+    assert sols[0] and not complete
+
+
+@pytest.mark.parametrize("gap", [0.0, 0.05, None])
+def test_gap_reported(limits, gap):
+    md = FakeModel(gap=gap)
+    (sols,), _ = def_chain.get_rk_solution([None], [1], 10, md)
+    assert sols[0].gap == gap
+
+
+def test_cut_short_block_not_cached(limits, graphs, kg, tmp_path):
+    cache = RK_Solution_Cache(tmp_path)
+    get_block = lambda: def_chain.get_rk_block(
+        [kg], 3, 3, cache=cache, ano_sg=graphs.S_graph
+    )
+    # -> only the first budget is solved once the deadline is passed
+    limits.update(deadline=time.time() - 1)
+    (short,) = get_block()
+    assert os.listdir(tmp_path) == []
+    limits.update(deadline=None)
+    (block,) = get_block()
+    (ref,) = def_chain.get_rk_block([kg], 3, 3)
+    assert len(short.sols) < len(block.sols) == len(ref.sols)
+    assert len(os.listdir(tmp_path)) == 1
+    (cached,) = get_block()
+    assert len(cached.sols) == len(ref.sols)